@@ -1,101 +1,206 @@
-import requests
 import json
 import time
 import os
 import re
 import subprocess
 
-import sounddevice as sd
-from scipy.io.wavfile import write
+import numpy as np
 
-#Vosk
-import wave
-import json
-from vosk import Model, KaldiRecognizer
-
-#Faster Whisper
-import whisper
-from faster_whisper import WhisperModel
+import audio_llm
+import audio_utils
+import endpointing
+import llm_cache
+import llm_client
+import sources
+import startup
+import streaming_stt
+import stt_models
+import vosk_grammar
 
 
 class LLM_Joke(object):
 
-    def __init__(self, joke_script, extra_info=""):
+    def __init__(self, joke_script, extra_info="", whisper_size="tiny.en", vosk_model_path="vosk-model", options=None, use_cache=True, audio_source=None, streaming=False, endpointer=None, grammar=None, grammar_model_path="vosk-model-small-en-us-0.15", min_confidence=0.6, mode="two-stage"):
         self.joke_script = joke_script
+        # Live mic by default, or e.g. "wav:received_files/" for offline runs
+        audio_source = audio_source or os.getenv("JOKE_AUDIO_SOURCE", "mic")
+        self.audio_source = sources.make_audio(audio_source) if isinstance(audio_source, str) else audio_source
+        self.options = options
+        self.cache = llm_cache.get_cache() if use_cache else None
         self.extra_info = extra_info
         self.stt_result = ""
         self.url = "http://localhost:11434/api/chat"
-
-
-    def llama3(self, url, prompt):
-        data = {
-            "model": "qwen3:1.7b",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-
-                }
-            ],
-            "stream": False,
-        }
-
-        headers = {
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, headers=headers, json=data)
-        return response.json()['message']['content']
-
-    def faster_whisper_stt(self):
-        model = WhisperModel("tiny.en", device="cpu", compute_type="int8")
-        segments, _ = model.transcribe("location.wav", beam_size=1)
+        self.whisper_size = whisper_size
+        self.vosk_model_path = vosk_model_path
+        self.audio = None
+        # Stops recording on trailing silence; min/max duration bound the capture
+        self.endpointer = endpointer or endpointing.Endpointer(min_duration=0.5, max_duration=6.0, silence=0.5)
+        # Closed-vocabulary answers ("location", "profession" or vocab file paths)
+        # are decoded by Vosk against a phrase grammar while recording
+        self.grammar = grammar
+        self.grammar_model_path = grammar_model_path
+        self.min_confidence = min_confidence
+        # "two-stage" (STT then LLM) or "audio-llm" (gemma-3n hears the answer directly)
+        if mode not in ("two-stage", "audio-llm"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.mode = mode
+        # Streaming STT returns the answer as soon as the speaker stops
+        self.streaming = streaming
+
+
+    def llama3(self, url, prompt, **kwargs):
+        # Shared backend (pooled Ollama session or in-process llama.cpp)
+        client = llm_client.get_client()
+        if isinstance(client, llm_client.OllamaClient) and url != client.url:
+            client = llm_client.OllamaClient(url=url)
+        if self.options:
+            # Stream and stop as soon as one of the allowed words shows up
+            match, text = client.first_match(prompt, self.options, **kwargs)
+            return match if match else text
+        return client.chat(prompt, **kwargs)
+
+    def classify(self, prompt, options=None, **kwargs):
+        """Constrained single-call choice between the allowed options."""
+        options = options or self.options
+        return llm_client.get_client().classify(prompt, options, **kwargs)
+
+    def faster_whisper_stt(self, audio=None):
+        # Takes the in-memory 16 kHz recording by default, or a WAV path
+        audio = self._stt_input(audio)
+        model = stt_models.get_whisper_model(self.whisper_size)
+        segments, _ = model.transcribe(audio_utils.int16_to_float32(audio), beam_size=1)
         text = " ".join(seg.text.strip() for seg in segments)
         return text
 
-    def vosk_stt(self, audio_path="location.wav", model_path="vosk-model"):
-        # Load Vosk model
-        model = Model(model_path)
-        recognizer = KaldiRecognizer(model, 16000)  # Sample rate expected by Vosk
-
-        # Open the WAV file
-        with wave.open(audio_path, "rb") as wf:
-            if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != 16000:
-                subprocess.run("ffmpeg -i location.wav -ac 1 -ar 16000 -acodec pcm_s16le location2.wav", shell=True, check=True)
-                raise ValueError("Audio file must be WAV format, Mono, 16-bit PCM, 16kHz")
-            
-            while True:
-                data = wf.readframes(4000)  # Read 4000 frames at a time
-                if len(data) == 0:
-                    break
-                recognizer.AcceptWaveform(data)
+    def vosk_stt(self, audio=None, model_path=None):
+        # Shared Vosk model, only loaded from disk the first time
+        audio = self._stt_input(audio)
+        model = stt_models.get_vosk_model(model_path or self.vosk_model_path)
+        recognizer = startup.load("vosk").KaldiRecognizer(model, audio_utils.STT_RATE)
+
+        pcm = memoryview(np.ascontiguousarray(audio, dtype=np.int16)).cast("B")
+        step = 4000 * 2  # 4000 int16 frames at a time
+        for i in range(0, len(pcm), step):
+            recognizer.AcceptWaveform(bytes(pcm[i:i + step]))
 
         # Get the transcription result
         result = json.loads(recognizer.FinalResult())
         return result.get("text", "")
 
+    def vosk_grammar_stt(self, vocabulary=None, model_path=None):
+        """
+        Record and decode at the same time against a phrase list; returns a
+        GrammarMatch(text, confidence) as soon as the speaker stops.
+        """
+        recognizer = vosk_grammar.get_recognizer(vocabulary or self.grammar, model_path or self.grammar_model_path)
+        print("Recording...")
+        audio, sample_rate = self.audio_source.listen(self.endpointer, on_frame=recognizer.accept)
+        self.audio = audio_utils.prepare_for_stt(audio, sample_rate)
+        return recognizer.result()
+
+    def _stt_input(self, audio):
+        if audio is None:
+            if self.audio is None:
+                raise ValueError("No audio recorded, call record_audio() first")
+            return self.audio
+        if isinstance(audio, (str, os.PathLike)):
+            audio, rate = audio_utils.read_wav(audio)
+            return audio_utils.resample(audio, rate)
+        return audio
+
     def piper_tts(self, location, response, filename):
         command = f"echo \"How we doing, {location}? I hear it's {response} here this time of year.\" | piper --model en_US-lessac-medium --output_file {filename}"
         subprocess.run(command, shell=True, check=True)
         return filename
 
-    def record_audio(self, duration=2, filename="location2.wav", sample_rate=44100):
+    def record_audio(self, duration=None, filename=None):
+        """Record until the speaker stops (VAD endpointing), or for a fixed *duration*."""
         print("Recording...")
-        audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='int16')
-        sd.wait()  # Wait until recording is finished
-        write(filename, sample_rate, audio)
-        subprocess.run("ffmpeg -i location2.wav -ac 1 -ar 16000 -acodec pcm_s16le location.wav", shell=True, check=True)
-        print(f"Recording saved as {filename}")
+        start = time.time()
+        if duration is None:
+            audio, sample_rate = self.audio_source.listen(self.endpointer)
+        else:
+            audio, sample_rate = self.audio_source.read(duration)
+        print(f"Captured {len(audio) / sample_rate:.2f}s of audio in {time.time() - start:.2f}s")
+        # Resample in-process and keep the result in memory for STT
+        self.audio = audio_utils.prepare_for_stt(audio, sample_rate)
+        if filename:
+            audio_utils.write_wav(filename, self.audio)
+            print(f"Recording saved as {filename}")
+        return self.audio
+
+    def answer(self, transcript, store=True):
+        """
+        LLM answer for *transcript*, from the cache when we have seen it before.
+        With store=False a new answer is not written to the cache (speculative
+        answers to partial transcripts).
+        """
+        request = self.joke_script.format(location=transcript, profession=transcript)
+        client = llm_client.get_client()
+        # Everything before the placeholder is the same for every answer
+        client.cache_prefix(self.joke_script.partition("{")[0])
+        model = client.model
+        response = self.cache.get(self.joke_script, transcript, model) if self.cache else None
+        if response is None:
+            if self.options:
+                response = self.classify(request)
+            else:
+                response = self.llama3(self.url, request)
+            if self.cache and store:
+                self.cache.put(self.joke_script, transcript, model, response)
+        else:
+            print("LLM cache hit")
+        return request, response
+
+    def audio_answer(self, audio=None):
+        """(entity, answer) straight from the recording, no separate STT stage."""
+        if not self.options:
+            raise ValueError("audio-llm mode needs a list of options")
+        return audio_llm.get_audio_llm().ask(self._stt_input(audio), self.joke_script, self.options)
+
+    def streamer(self):
+        return streaming_stt.get_transcriber(self.whisper_size)
+
+    def listen_streaming(self, max_seconds=8):
+        """Transcribe while recording; returns when the VAD sees the answer end."""
+        print("Listening...")
+        if isinstance(self.audio_source, sources.MicSource):
+            return streaming_stt.listen_once(self.streamer(), max_seconds, self.audio_source.sample_rate)
+        audio, sample_rate = self.audio_source.read(max_seconds)
+        return streaming_stt.transcribe_clip(self.streamer(), audio, sample_rate, realtime=self.audio_source.realtime)
 
     def main(self):
-        self.record_audio()
-        start = time.time()
-        self.stt_result = self.faster_whisper_stt()
-        print(f"Whisper Time: {time.time() - start}")
-        #os.remove("location.wav")
+        if self.mode == "audio-llm":
+            self.record_audio()
+            start = time.time()
+            self.stt_result, response = self.audio_answer()
+            print(f"Audio LLM Time: {time.time() - start}")
+            print(self.stt_result)
+            print(response)
+            return response
+
+        if self.grammar:
+            start = time.time()
+            match = self.vosk_grammar_stt()
+            print(f"Grammar STT Time (to end of speech): {time.time() - start} ({match.text!r}, {match.confidence:.2f})")
+            if match.confidence >= self.min_confidence:
+                self.stt_result = match.text
+            else:
+                # Not one of our phrases: fall back to open decoding of the same audio
+                self.stt_result = self.faster_whisper_stt()
+                print(f"Whisper fallback Time: {time.time() - start}")
+        elif self.streaming:
+            start = time.time()
+            self.stt_result = self.listen_streaming()
+            print(f"Streaming STT Time (to end of speech): {time.time() - start}")
+        else:
+            self.record_audio()
+            start = time.time()
+            self.stt_result = self.faster_whisper_stt()
+            print(f"Whisper Time: {time.time() - start}")
         
         start_llm = time.time()
-        request = self.joke_script.format(location=self.stt_result)
-        response = self.llama3(self.url, request)
+        request, response = self.answer(self.stt_result)
         print(f"LLM Time: {time.time() - start_llm}")
 
         start_tts = time.time()
@@ -111,6 +216,5 @@ class LLM_Joke(object):
     
 if __name__ == "__main__":
     joke_string = "Based on the likely actual weather in {location} in the Winter, say an option closest to the likely weather (Sunny, Cold, Rainy, Stormy, Overcast). SAY ONLY ONE WORD"
-    joke = LLM_Joke(joke_string)
+    joke = LLM_Joke(joke_string, options=["Sunny", "Cold", "Rainy", "Stormy", "Overcast"])
     joke.main()
-    os.remove("location.wav")
@@ -0,0 +1,100 @@
+"""
+Always-on audience monitor.
+
+Keeps the vision engine running at a low frame rate in the background and
+maintains a rolling, exponentially decayed window of face counts and
+emotion scores, so "start count" / "start emotion" can be answered from the
+current snapshot instead of a fresh blocking scan.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from vision_engine import EMOTIONS, dominant
+
+
+class AudienceSnapshot(object):
+    __slots__ = ("faces", "emotions", "dominant_emotion", "samples", "age")
+
+    def __init__(self, faces, emotions, dominant_emotion, samples, age):
+        self.faces = faces
+        self.emotions = emotions
+        self.dominant_emotion = dominant_emotion
+        self.samples = samples
+        self.age = age
+
+
+class AudienceMonitor(object):
+    """
+    *window* is how many seconds of results are kept, *decay* the time
+    constant in seconds of the exponential weighting (newer frames count
+    more), and *fps* the per-camera analysis rate while idle. *analyze*
+    overrides the engine's analysis function, e.g. to run the emotion model
+    on only some frames.
+    """
+
+    def __init__(self, engine, fps=3, window=6.0, decay=2.0, analyze=None):
+        self.engine = engine
+        self.analyze = analyze
+        self.fps = fps
+        self.window = window
+        self.decay = decay
+        self._results = deque()
+        self._lock = threading.Lock()
+        self._subscription = None
+        self.running = False
+
+    def start(self):
+        # Our own subscription, so one-off samples on the same engine leave it running
+        self._subscription = self.engine.attach(self._add, fps=self.fps, analyze=self.analyze)
+        self.running = True
+
+    def stop(self):
+        self.engine.detach(self._subscription)
+        self._subscription = None
+        self.running = False
+
+    def _add(self, result):
+        counts = {k: 0.0 for k in EMOTIONS}
+        for face in result.faces:
+            for key, value in face.get('emotion', {}).items():
+                counts[key] = counts.get(key, 0.0) + value
+        with self._lock:
+            self._results.append((result.timestamp, result.camera, len(result.faces), counts))
+            self._trim(time.time())
+
+    def _trim(self, now):
+        while self._results and now - self._results[0][0] > self.window:
+            self._results.popleft()
+
+    def snapshot(self):
+        """Current decayed estimate; faces is summed over cameras."""
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            results = list(self._results)
+        weights = {}
+        faces = {}
+        emotions = dict.fromkeys(EMOTIONS, 0.0)
+        newest = 0.0
+        for timestamp, camera, count, counts in results:
+            w = math.exp(-(now - timestamp) / self.decay) if self.decay else 1.0
+            weights[camera] = weights.get(camera, 0.0) + w
+            faces[camera] = faces.get(camera, 0.0) + w * count
+            for key, value in counts.items():
+                emotions[key] = emotions.get(key, 0.0) + w * value
+            newest = max(newest, timestamp)
+        total_faces = sum(faces[c] / weights[c] for c in faces if weights[c] > 0)
+        age = now - newest if results else float("inf")
+        return AudienceSnapshot(total_faces, emotions, dominant(emotions), len(results), age)
+
+    def wait_ready(self, min_samples=1, timeout=2.0):
+        """Block until the window holds *min_samples* results (e.g. right after start)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if len(self._results) >= min_samples:
+                    return True
+            time.sleep(0.02)
+        return False
@@ -0,0 +1,130 @@
+"""
+Direct audio-to-LLM answers with gemma-3n's audio input.
+
+Instead of Whisper -> text -> LLM, the recorded answer goes straight to
+gemma-3n together with the joke question. One call returns both what the
+person said (the city or profession, still needed for the joke text) and
+the classification, so there is one model to load and one stage to run.
+
+    llm = get_audio_llm()
+    entity, answer = llm.ask("answer.wav", joke_script, ["sunny", "rainy"])
+
+The text GGUF alone cannot hear anything: the default chat template turns
+the audio item into a placeholder. AUDIO_LLM_MMPROJ must point at the
+model's audio projector and AUDIO_LLM_HANDLER name the
+llama_cpp.llama_chat_format handler that encodes audio with it; AudioLLM
+refuses to load without them.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import audio_utils
+import startup
+from llm_client import _match_option
+
+DEFAULT_MODEL = os.getenv("AUDIO_LLM_MODEL", "gemma-3n-E2B-it-GGUF/gemma-3n-E2B-it-Q8_0.gguf")
+DEFAULT_MMPROJ = os.getenv("AUDIO_LLM_MMPROJ")    # Audio projector GGUF for the model
+DEFAULT_HANDLER = os.getenv("AUDIO_LLM_HANDLER")  # Chat handler class taking clip_model_path
+
+# What the placeholders in a joke_script become when the LLM hears the answer
+PLACEHOLDERS = {"location": "the place the speaker names", "profession": "the profession the speaker names"}
+
+
+class AudioLLM(object):
+
+    def __init__(self, model_path=DEFAULT_MODEL, mmproj_path=DEFAULT_MMPROJ, chat_handler=DEFAULT_HANDLER,
+                 n_threads=None, n_ctx=2048, verbose=False):
+        # *chat_handler* is a handler instance, or a llama_chat_format class name built with *mmproj_path*
+        if chat_handler is None or (isinstance(chat_handler, str) and not mmproj_path):
+            raise RuntimeError("audio-llm mode needs an audio-capable chat handler: set AUDIO_LLM_MMPROJ to the "
+                               "model's audio projector and AUDIO_LLM_HANDLER to the llama_cpp.llama_chat_format "
+                               "handler that encodes audio, otherwise the model never hears the clip")
+        llama_cpp = startup.load("llama_cpp")
+        start = time.time()
+        if isinstance(chat_handler, str):
+            handler_class = getattr(startup.load("llama_cpp.llama_chat_format"), chat_handler)
+            chat_handler = handler_class(clip_model_path=mmproj_path, verbose=verbose)
+        self.llm = llama_cpp.Llama(model_path=model_path, chat_handler=chat_handler, n_ctx=n_ctx,
+                                   n_threads=n_threads, n_threads_batch=n_threads, verbose=verbose)
+        startup.record("audio LLM model load", time.time() - start)
+        print(f"Loaded {model_path} in {time.time() - start:.2f}s")
+        self.model = os.path.basename(model_path)
+        self._lock = threading.Lock()
+
+    def ask(self, audio, joke_script, options, sample_rate=audio_utils.STT_RATE):
+        """
+        (entity, answer) for a WAV path or a 16 kHz int16 array. *answer* is
+        always one of *options*; *entity* is "" if nothing was understood.
+        """
+        if isinstance(audio, (str, os.PathLike)):
+            return self._ask(str(audio), joke_script, options)
+        # The chat handler takes audio by path, so in-memory audio goes through a temp file
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            audio_utils.write_wav(path, audio, sample_rate)
+            return self._ask(path, joke_script, options)
+        finally:
+            os.remove(path)
+
+    def _ask(self, path, joke_script, options):
+        kind = "location" if "{location}" in joke_script else "profession"
+        question = joke_script.format(**PLACEHOLDERS)
+        schema = {
+            "type": "object",
+            "properties": {"entity": {"type": "string"}, "answer": {"type": "string", "enum": list(options)}},
+            "required": ["entity", "answer"],
+        }
+        messages = [
+            {
+                "role": "system",
+                "content": [{"type": "text", "text": f"The audio is someone saying their {kind}. Reply with JSON: "
+                                                     f"\"entity\" is the {kind} exactly as said, \"answer\" is one of "
+                                                     f"({', '.join(options)})."}]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "audio", "audio": path},
+                    {"type": "text", "text": question},
+                ]
+            }
+        ]
+        with self._lock:
+            response = self.llm.create_chat_completion(
+                messages=messages,
+                max_tokens=48,
+                temperature=0,
+                response_format={"type": "json_object", "schema": schema},
+            )
+        return parse_reply(response["choices"][0]["message"]["content"], options)
+
+
+def parse_reply(text, options):
+    """(entity, answer) from the model's JSON, tolerating a malformed reply."""
+    try:
+        data = json.loads(text)
+        entity, answer = str(data.get("entity", "")).strip(), data.get("answer")
+    except (ValueError, AttributeError):
+        match = re.search(r'"entity"\s*:\s*"([^"]*)"', text)
+        entity, answer = (match.group(1).strip() if match else ""), None
+    if answer not in options:
+        answer = _match_option(text, {o.lower(): o for o in options}, final=True) or options[0]
+    return entity, answer
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_audio_llm():
+    """Process-wide shared model, loaded on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AudioLLM(n_threads=int(os.getenv("LLAMA_THREADS", "0")) or None)
+    return _default
@@ -0,0 +1,113 @@
+"""
+Two-stage (faster-whisper -> LLM) vs direct audio-to-LLM (gemma-3n).
+
+For every clip in the corpus both paths produce (entity, answer); we report
+model load time, per-clip latency, entity accuracy against the reference
+transcript in clip.txt, answer accuracy against an optional labels file and
+how often the two paths agree.
+
+    python audio_llm_benchmark.py --corpus clips/ --style 1 --labels labels.json
+
+labels.json maps clip file names to the expected option, e.g.
+{"portland.wav": "rainy"}.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import audio_llm
+import audio_utils
+import joke_templates
+import llm_cache
+import llm_client
+import stt_models
+from stt_speed_test import load_corpus
+
+SCRIPTS = {
+    1: ("Based on the likely actual weather in {location} in the Winter, say an option closest to the likely "
+        "weather (Sunny, Cold, Rainy, Stormy, Overcast, Warm, Windy). SAY ONLY ONE WORD", joke_templates.WEATHER_OPTIONS),
+    2: ("Is the {profession} a high-paying or low-paying profession. Choose between (high, low). SAY ONLY ONE WORD",
+        joke_templates.PAY_OPTIONS),
+}
+
+
+def two_stage(audio, script, options, whisper_size):
+    model = stt_models.get_whisper_model(whisper_size)
+    segments, _ = model.transcribe(audio_utils.int16_to_float32(audio), beam_size=1)
+    entity = " ".join(seg.text.strip() for seg in segments).strip()
+    prompt = script.format(location=entity, profession=entity)
+    return entity, llm_client.get_client().classify(prompt, list(options))
+
+
+def direct(audio, script, options):
+    return audio_llm.get_audio_llm().ask(audio, script, list(options))
+
+
+def _entity_ok(reference, entity):
+    reference, entity = llm_cache.normalize(reference), llm_cache.normalize(entity)
+    return bool(reference) and (reference == entity or reference in entity)
+
+
+def run_path(name, func, corpus, labels):
+    start = time.time()
+    func(corpus[0]["audio"])  # Cold: model load plus first call
+    cold = time.time() - start
+    latencies, rows = [], []
+    for clip in corpus:
+        start = time.time()
+        entity, answer = func(clip["audio"])
+        latencies.append(time.time() - start)
+        rows.append((entity, answer))
+    scored = [(clip, row) for clip, row in zip(corpus, rows) if clip["reference"]]
+    labelled = [(clip, row) for clip, row in zip(corpus, rows) if os.path.basename(clip["path"]) in labels]
+    return {
+        "path": name,
+        "cold_s": cold,
+        "latency_median_s": statistics.median(latencies),
+        "latency_mean_s": statistics.mean(latencies),
+        "entity_accuracy": (sum(_entity_ok(c["reference"], r[0]) for c, r in scored) / len(scored)) if scored else None,
+        "answer_accuracy": (sum(r[1].lower() == labels[os.path.basename(c["path"])].lower() for c, r in labelled)
+                            / len(labelled)) if labelled else None,
+        "outputs": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the two-stage STT+LLM path with gemma-3n audio input")
+    parser.add_argument("--corpus", default="location2.wav", help="WAV file, directory or glob (references in .txt)")
+    parser.add_argument("--style", type=int, choices=(1, 2), default=1, help="1 = weather, 2 = pay")
+    parser.add_argument("--labels", help="JSON file of expected answers by clip name")
+    parser.add_argument("--whisper-size", default="tiny.en")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+    if not (audio_llm.DEFAULT_MMPROJ and audio_llm.DEFAULT_HANDLER):
+        # Without them the model is handed a placeholder instead of the clip
+        parser.error("set AUDIO_LLM_MMPROJ and AUDIO_LLM_HANDLER so gemma-3n can hear the clips")
+
+    corpus = load_corpus(args.corpus)
+    labels = json.load(open(args.labels)) if args.labels else {}
+    script, options = SCRIPTS[args.style]
+    results = [
+        run_path("two-stage", lambda audio: two_stage(audio, script, options, args.whisper_size), corpus, labels),
+        run_path("audio-llm", lambda audio: direct(audio, script, options), corpus, labels),
+    ]
+    agree = sum(a[1] == b[1] for a, b in zip(results[0]["outputs"], results[1]["outputs"])) / len(corpus)
+
+    print("-" * 60)
+    for clip, a, b in zip(corpus, results[0]["outputs"], results[1]["outputs"]):
+        print(f"{os.path.basename(clip['path'])}: two-stage {a} | audio-llm {b}")
+    print("-" * 60)
+    fmt = lambda value: "n/a" if value is None else f"{value:.0%}"
+    for row in results:
+        print(f"{row['path']:<10} cold {row['cold_s']:6.2f} s  median {row['latency_median_s']:6.3f} s  "
+              f"entity {fmt(row['entity_accuracy']):>4}  answer {fmt(row['answer_accuracy']):>4}")
+    print(f"Answers agree on {agree:.0%} of clips")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "agreement": agree}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
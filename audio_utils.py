@@ -0,0 +1,107 @@
+import wave
+from math import gcd
+
+import numpy as np
+
+import startup
+
+STT_RATE = 16000  # Sample rate expected by both Whisper and Vosk
+
+
+def to_mono(audio):
+    """Collapse an (n, channels) capture buffer to a 1-D array."""
+    if audio.ndim == 1:
+        return audio
+    if audio.shape[1] == 1:
+        return audio[:, 0]  # view, no copy
+    return audio.mean(axis=1).astype(audio.dtype)
+
+
+def resample(audio, orig_rate, target_rate=STT_RATE):
+    """
+    Polyphase resample of a mono int16 array (44.1 kHz -> 16 kHz is 160/441).
+    Returns int16 so the result can go straight to Vosk or be scaled for Whisper.
+    """
+    if orig_rate == target_rate:
+        return audio
+    g = gcd(orig_rate, target_rate)
+    resample_poly = startup.load("scipy.signal").resample_poly
+    out = resample_poly(audio.astype(np.float32), target_rate // g, orig_rate // g)
+    np.clip(out, -32768, 32767, out=out)
+    return out.astype(np.int16)
+
+
+class StreamResampler(object):
+    """
+    Resamples a live stream block by block. resample() on each mic block on
+    its own rings at every block edge; here the anti-alias filter state and
+    the output sample phase carry over from one block to the next, so the
+    joined output is the same as resampling the whole recording.
+    """
+
+    def __init__(self, orig_rate, target_rate=STT_RATE, taps=63):
+        self.orig_rate = orig_rate
+        self.target_rate = target_rate
+        self.step = orig_rate / target_rate  # Input samples per output sample
+        self._signal = startup.load("scipy.signal")
+        self._fir = None
+        if self.step > 1:
+            self._fir = self._signal.firwin(taps, 0.9 / self.step).astype(np.float32)
+            self._zi = np.zeros(taps - 1, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        if self._fir is not None:
+            self._zi[:] = 0
+        self._last = 0.0  # Last filtered sample of the previous block
+        self._pos = 1.0   # Next output position; index 0 is self._last
+
+    def process(self, pcm16):
+        """Mono int16 block in, int16 at target_rate out (length varies by a sample)."""
+        if self.orig_rate == self.target_rate:
+            return pcm16
+        x = np.asarray(pcm16, dtype=np.float32)
+        if self._fir is not None:
+            x, self._zi = self._signal.lfilter(self._fir, 1.0, x, zi=self._zi)
+        x = np.concatenate(([self._last], x))
+        positions = np.arange(self._pos, len(x) - 1, self.step)
+        out = np.interp(positions, np.arange(len(x)), x)
+        self._pos = (positions[-1] + self.step if len(positions) else self._pos) - (len(x) - 1)
+        self._last = x[-1]
+        np.clip(out, -32768, 32767, out=out)
+        return out.astype(np.int16)
+
+
+def int16_to_float32(audio):
+    """Scale int16 PCM into the [-1, 1) float32 range faster-whisper expects."""
+    return audio.astype(np.float32) / 32768.0
+
+
+def float32_to_int16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def prepare_for_stt(audio, sample_rate):
+    """Mono 16 kHz int16 array from a raw sounddevice capture."""
+    return resample(to_mono(audio), sample_rate, STT_RATE)
+
+
+def read_wav(path):
+    """Read a 16-bit PCM WAV into (mono int16 array, sample_rate)."""
+    with wave.open(str(path), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("Audio file must be 16-bit PCM")
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if channels > 1:
+        audio = to_mono(audio.reshape(-1, channels))
+    return audio, rate
+
+
+def write_wav(path, audio, sample_rate=STT_RATE):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.ascontiguousarray(audio, dtype=np.int16).tobytes())
@@ -0,0 +1,153 @@
+"""
+Batch transcription of recordings across a process pool.
+
+Each worker process loads its STT model once and then transcribes whole
+files; results are appended to a JSONL file as they complete, so a crashed
+or interrupted run picks up where it stopped when started again with the
+same output file.
+
+    python batch_transcribe.py received_files/ "clips/*.wav" -o transcripts.jsonl
+    python batch_transcribe.py received_files/ --engine vosk --workers 4
+
+By default the cores are split between workers and decoder threads
+(workers x cpu_threads = cores): two threads per faster-whisper worker,
+one per Vosk worker since Vosk decodes on a single thread anyway.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+_engine = None
+
+
+def _init_worker(engine_name, options, threads):
+    # Thread env vars must be set before the numeric libraries are imported
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    global _engine
+    import stt_speed_test
+    _engine = stt_speed_test.ENGINES[engine_name](**options)
+    _engine.load()
+
+
+def _transcribe(path):
+    import audio_utils
+    import stt_speed_test
+    start = time.time()
+    audio = stt_speed_test.load_audio(path)
+    text = _engine.transcribe(audio)
+    return {"path": path, "text": text, "audio_s": round(len(audio) / audio_utils.STT_RATE, 3),
+            "seconds": round(time.time() - start, 3), "worker": os.getpid()}
+
+
+def find_files(inputs):
+    """WAV files under each input (directory, file or glob), largest first."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, "**", "*.wav"), recursive=True))
+        else:
+            paths.update(glob.glob(item))
+    # Longest jobs first so one big file does not straggle at the end
+    return sorted(paths, key=lambda p: -os.path.getsize(p))
+
+
+def completed(output):
+    """Paths already transcribed successfully in an earlier run."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # Partial last line from a crash
+            if "text" in row:
+                done.add(row["path"])
+    return done
+
+
+def _terminate_partial_line(output):
+    """Start appends on a fresh line if the last run died mid-write."""
+    if os.path.exists(output) and os.path.getsize(output):
+        with open(output, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def plan_threads(engine, workers=None, threads=None, cores=None):
+    """(workers, cpu_threads per worker) so that workers x threads ~= cores."""
+    cores = cores or os.cpu_count() or 1
+    if threads is None:
+        threads = 1 if engine == "vosk" else min(2, cores)
+    if workers is None:
+        workers = max(1, cores // threads)
+    return workers, threads
+
+
+def run(inputs, output, engine="faster-whisper", model=None, compute_type="int8", workers=None, threads=None):
+    paths = find_files(inputs)
+    done = completed(output)
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} files, {len(done & set(paths))} already done, {len(todo)} to transcribe")
+    if not todo:
+        return
+
+    workers, threads = plan_threads(engine, workers, threads)
+    workers = min(workers, len(todo))
+    if engine == "faster-whisper":
+        options = {"model_size": model or "tiny.en", "compute_type": compute_type, "cpu_threads": threads}
+    elif engine == "vosk":
+        options = {"model_path": model} if model else {}
+    else:
+        options = {"model_size": model} if model else {}
+    print(f"{workers} workers x {threads} threads, {engine} {options}")
+
+    start = time.time()
+    audio_total = 0.0
+    _terminate_partial_line(output)
+    with open(output, "a") as out, ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(engine, options, threads)) as pool:
+        futures = {pool.submit(_transcribe, path): path for path in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                row = future.result()
+                audio_total += row["audio_s"]
+            except Exception as e:
+                row = {"path": futures[future], "error": str(e)}
+            # One flushed line per file: a crash loses at most the files in flight
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+            print(f"[{i}/{len(todo)}] {row['path']}: {row.get('text', row.get('error'))}")
+
+    elapsed = time.time() - start
+    print(f"Transcribed {audio_total:.1f}s of audio in {elapsed:.1f}s "
+          f"({audio_total / elapsed:.1f}x real time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe directories of recordings in parallel")
+    parser.add_argument("inputs", nargs="+", help="Directories, WAV files or globs")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl")
+    parser.add_argument("--engine", default="faster-whisper", choices=("faster-whisper", "vosk", "whisper"))
+    parser.add_argument("--model", help="Whisper model size or Vosk model directory")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads", type=int, help="Decoder threads per worker")
+    args = parser.parse_args()
+    try:
+        run(args.inputs, args.output, args.engine, args.model, args.compute_type, args.workers, args.threads)
+    except KeyboardInterrupt:
+        sys.exit("Interrupted; run again with the same --output to resume")
+
+
+if __name__ == "__main__":
+    main()
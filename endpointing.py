@@ -0,0 +1,121 @@
+"""
+Voice-activity endpointing: record until the speaker stops.
+
+Mic blocks are captured at the device rate into a preallocated buffer and
+each 30 ms block is classified by WebRTC VAD (energy threshold if webrtcvad
+is not installed). Recording stops after `silence` seconds of trailing
+non-speech once speech has been heard and `min_duration` has passed, or at
+`max_duration`, so capture time tracks the length of the answer.
+"""
+import time
+
+import numpy as np
+
+import audio_utils
+import startup
+
+FRAME_MS = 30  # WebRTC VAD accepts 10, 20 or 30 ms frames
+
+
+class FrameVAD(object):
+    """Speech / non-speech decision for one 16 kHz int16 frame."""
+
+    def __init__(self, aggressiveness=2, energy_threshold=500):
+        self.energy_threshold = energy_threshold
+        try:
+            self._vad = startup.load("webrtcvad").Vad(aggressiveness)
+        except ImportError:
+            self._vad = None
+        self.frame_samples = audio_utils.STT_RATE * FRAME_MS // 1000
+
+    def is_speech(self, frame):
+        if len(frame) != self.frame_samples:
+            frame = np.resize(frame, self.frame_samples)
+        if self._vad is not None:
+            return self._vad.is_speech(np.ascontiguousarray(frame, dtype=np.int16).tobytes(), audio_utils.STT_RATE)
+        return np.sqrt(np.mean(frame.astype(np.float32) ** 2)) > self.energy_threshold
+
+
+class Endpointer(object):
+    """Tracks speech/silence frame by frame and decides when the utterance is over."""
+
+    def __init__(self, min_duration=0.5, max_duration=6.0, silence=0.5, no_speech_timeout=4.0, vad=None):
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.silence = silence
+        self.no_speech_timeout = no_speech_timeout
+        self.vad = vad or FrameVAD()
+        self.reset()
+
+    def reset(self):
+        self.elapsed = 0.0
+        self.heard_speech = False
+        self.trailing_silence = 0.0
+        self.speech_end = 0.0  # Seconds into the capture where speech last ended
+
+    def update(self, frame):
+        """Add one 16 kHz frame; returns True once recording should stop."""
+        self.elapsed += len(frame) / audio_utils.STT_RATE
+        if self.vad.is_speech(frame):
+            self.heard_speech = True
+            self.trailing_silence = 0.0
+            self.speech_end = self.elapsed
+        else:
+            self.trailing_silence += len(frame) / audio_utils.STT_RATE
+        if self.elapsed >= self.max_duration:
+            return True
+        if not self.heard_speech:
+            return self.elapsed >= self.no_speech_timeout
+        return self.elapsed >= self.min_duration and self.trailing_silence >= self.silence
+
+    def end_sample(self, sample_rate, tail=0.2):
+        """Where to trim a capture at *sample_rate*: end of speech plus a short tail."""
+        if not self.heard_speech:
+            return int(self.elapsed * sample_rate)
+        return int(min(self.elapsed, max(self.speech_end + tail, self.min_duration)) * sample_rate)
+
+
+def record_utterance(sample_rate=44100, endpointer=None, on_frame=None):
+    """
+    Record from the default mic until the endpointer fires.
+    Returns (mono int16 array at *sample_rate*, sample_rate). *on_frame* gets
+    every 16 kHz frame as it arrives, e.g. to feed a streaming recognizer.
+    """
+    sd = startup.load("sounddevice")
+    endpointer = endpointer or Endpointer()
+    endpointer.reset()
+    block = sample_rate * FRAME_MS // 1000
+    capture = np.zeros(int(endpointer.max_duration * sample_rate) + block, dtype=np.int16)
+    resampler = audio_utils.StreamResampler(sample_rate)
+    filled = 0
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype='int16', blocksize=block) as stream:
+        while True:
+            data, _ = stream.read(block)
+            frames = data[:, 0]
+            n = min(len(frames), len(capture) - filled)
+            capture[filled:filled + n] = frames[:n]
+            filled += n
+            frame = resampler.process(frames)
+            if on_frame is not None:
+                on_frame(frame)
+            if endpointer.update(frame) or filled >= len(capture):
+                break
+    return capture[:endpointer.end_sample(sample_rate)], sample_rate
+
+
+def endpoint_clip(audio, sample_rate, endpointer=None, realtime=False, on_frame=None):
+    """Run the endpointer over a recorded clip, as if it were arriving live."""
+    endpointer = endpointer or Endpointer()
+    endpointer.reset()
+    audio16 = audio_utils.resample(audio, sample_rate)
+    step = endpointer.vad.frame_samples
+    for i in range(0, len(audio16), step):
+        frame = audio16[i:i + step]
+        if on_frame is not None:
+            on_frame(frame)
+        if endpointer.update(frame):
+            break
+    end = endpointer.end_sample(sample_rate)
+    if realtime:
+        time.sleep(endpointer.elapsed)
+    return audio[:end], sample_rate
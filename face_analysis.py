@@ -0,0 +1,203 @@
+"""
+Face analysis backends for the vision engine.
+
+Counting faces only needs a detector, so the default path is an OpenCV Haar
+cascade run on a downscaled grayscale frame. The DeepFace emotion CNN is
+only run when emotions are actually wanted. Results use DeepFace's dict
+layout ({'region': {...}, 'emotion': {...}}) so callers need not care which
+backend produced them.
+"""
+import threading
+
+import numpy as np
+
+import startup
+
+_local = threading.local()
+
+
+def _cv2():
+    return startup.load("cv2")
+
+
+def _deepface():
+    # TensorFlow takes seconds to import, so only pay for it when emotion is used
+    return startup.load("deepface.DeepFace")
+
+
+def preload():
+    """Import DeepFace and build the emotion model ahead of the first request."""
+    analyze_emotion(np.zeros((48, 48, 3), dtype=np.uint8))
+
+
+def _cascade():
+    # CascadeClassifier is not safe to share between threads
+    cascade = getattr(_local, "cascade", None)
+    if cascade is None:
+        cv2 = _cv2()
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        _local.cascade = cascade
+    return cascade
+
+
+def to_gray(frame):
+    # Frames from picam_source carry the lores Y plane, no conversion needed
+    gray = getattr(frame, "gray", None)
+    if gray is not None:
+        return gray
+    if frame.ndim == 2:
+        return frame
+    cv2 = _cv2()
+    if frame.shape[2] == 4:
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def detect_faces(frame, detect_width=320, min_neighbors=5, min_size=24):
+    """Face boxes in full-frame coordinates, found on a downscaled frame."""
+    gray = to_gray(frame)
+    # The gray image may be smaller than the frame (lores stream)
+    scale = frame.shape[1] / gray.shape[1]
+    if gray.shape[1] > detect_width:
+        shrink = gray.shape[1] / detect_width
+        cv2 = _cv2()
+        gray = cv2.resize(gray, (detect_width, int(gray.shape[0] / shrink)), interpolation=cv2.INTER_AREA)
+        scale *= shrink
+    boxes = _cascade().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=min_neighbors,
+                                        minSize=(min_size, min_size))
+    return [{"region": {"x": int(x * scale), "y": int(y * scale), "w": int(w * scale), "h": int(h * scale)},
+             "face_confidence": 1.0}
+            for (x, y, w, h) in boxes]
+
+
+def analyze_emotion(frame):
+    """Full DeepFace detection + emotion model, without its no-face placeholder."""
+    results = _deepface().analyze(frame, actions=("emotion",), enforce_detection=False)
+    # With enforce_detection=False an empty frame still yields one whole-image
+    # result with face_confidence 0, which would be counted as a face
+    return [r for r in results if r.get("face_confidence", 1) > 0]
+
+
+class FaceAnalyzer(object):
+    """
+    Callable for VisionEngine. Runs only the detector, and adds the emotion
+    model on every *emotion_every*-th frame (0 = never, 1 = every frame).
+    """
+
+    def __init__(self, emotion_every=0, detect_width=320):
+        self.emotion_every = emotion_every
+        self.detect_width = detect_width
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, frame):
+        with self._lock:
+            self._calls += 1
+            run_emotion = self.emotion_every and self._calls % self.emotion_every == 0
+        if run_emotion:
+            return analyze_emotion(frame)
+        return detect_faces(frame, self.detect_width)
+
+
+def emotion_for_crop(crop):
+    """Emotion scores for an already-cropped face, skipping detection."""
+    result = _deepface().analyze(crop, actions=("emotion",), detector_backend="skip", enforce_detection=False)
+    return result[0]["emotion"]
+
+
+def _expand(region, shape, margin):
+    x, y, w, h = region["x"], region["y"], region["w"], region["h"]
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(shape[1], x + w + dx), min(shape[0], y + h + dy)
+    return x0, y0, x1, y1
+
+
+class FaceTracker(object):
+    """
+    Incremental analysis for one camera.
+
+    - A 64-px-wide grayscale thumbnail is diffed against the last analysed
+      frame; if the scene has not changed the previous result is reused.
+    - Otherwise the face boxes from the last full pass are tracked: the
+      detector is re-run only inside each (expanded) box, and the emotion
+      model gets just those crops.
+    - A full-frame pass runs every *full_every* analysed frames, after a
+      large change, or when tracking loses every face.
+    """
+
+    def __init__(self, emotion=False, full_every=10, static_threshold=2.0, change_threshold=12.0,
+                 margin=0.4, detect_width=320):
+        self.emotion = emotion
+        self.full_every = full_every
+        self.static_threshold = static_threshold
+        self.change_threshold = change_threshold
+        self.margin = margin
+        self.detect_width = detect_width
+        self._thumb = None
+        self._faces = None
+        self._since_full = 0
+        self._lock = threading.Lock()
+        self.stats = {"skipped": 0, "tracked": 0, "full": 0}
+
+    def _thumbnail(self, frame):
+        gray = to_gray(frame)
+        height = max(1, gray.shape[0] * 64 // gray.shape[1])
+        cv2 = _cv2()
+        return cv2.resize(gray, (64, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def __call__(self, frame):
+        thumb = self._thumbnail(frame)
+        with self._lock:
+            change = float(np.abs(thumb - self._thumb).mean()) if self._thumb is not None else None
+            faces = self._faces
+            due = self._since_full >= self.full_every
+            if faces is not None and change is not None and change < self.static_threshold and not due:
+                self.stats["skipped"] += 1
+                self._since_full += 1
+                return [dict(f) for f in faces]
+
+        full = faces is None or due or change is None or change >= self.change_threshold or not faces
+        result = self._full(frame) if full else self._track(frame, faces)
+        if result is None:  # Every tracked face was lost
+            full = True
+            result = self._full(frame)
+
+        with self._lock:
+            self._thumb = thumb
+            self._faces = result
+            self._since_full = 0 if full else self._since_full + 1
+            self.stats["full" if full else "tracked"] += 1
+        return result
+
+    def _full(self, frame):
+        return analyze_emotion(frame) if self.emotion else detect_faces(frame, self.detect_width)
+
+    def _track(self, frame, faces):
+        tracked = []
+        for face in faces:
+            x0, y0, x1, y1 = _expand(face["region"], frame.shape, self.margin)
+            crop = frame[y0:y1, x0:x1]
+            found = detect_faces(crop, self.detect_width)
+            if not found:
+                continue
+            region = found[0]["region"]
+            region = {"x": region["x"] + x0, "y": region["y"] + y0, "w": region["w"], "h": region["h"]}
+            updated = {"region": region, "face_confidence": 1.0}
+            if self.emotion:
+                fx, fy, fw, fh = region["x"], region["y"], region["w"], region["h"]
+                try:
+                    updated["emotion"] = emotion_for_crop(frame[fy:fy + fh, fx:fx + fw])
+                except Exception as e:
+                    print(f"Error during emotion detection on crop: {e}")
+            tracked.append(updated)
+        return tracked or None
+
+
+def incremental(cameras, emotion=False, **kwargs):
+    """Per-camera FaceTrackers, in the dict form VisionEngine accepts."""
+    return {name: FaceTracker(emotion=emotion, **kwargs) for name in cameras}
+
+
+count_only = FaceAnalyzer(emotion_every=0)
+with_emotion = FaceAnalyzer(emotion_every=1)
@@ -1,12 +1,12 @@
 import os
 import socket
-import struct
 import select
 
+import udp_transfer
+
 # Configuration
 UDP_IP = "10.42.0.1"
 UDP_PORT = 2033  # Change if needed
-BUFFER_SIZE = 4096  # Buffer for receiving data
 RECEIVED_TEXT_FILE = "received_texts.txt"
 RECEIVED_FILE_DIR = "received_files"
 
@@ -15,7 +15,9 @@ os.makedirs(RECEIVED_FILE_DIR, exist_ok=True)
 
 # Setup UDP socket
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)  # Room for a full window of packets
 sock.bind(("", UDP_PORT))  # Listen on all available interfaces
+receiver = udp_transfer.Receiver(sock)
 
 def send_text(text):
     """Send a text message over UDP."""
@@ -23,63 +25,54 @@ def send_text(text):
     print(f"Sent: {text}")
 
 def receive_data():
-    """Receive a WAV file over UDP and save it correctly."""
-    buffer = {}  # Dictionary to store received packets
-    receiving = False
-    sender_addr = None  # Ensure this variable is initialized
+    """
+    Receive the reply to one command: an answer code, optionally followed by
+    a WAV file (or a stream of them between SOS and EOS), saving any audio.
+    """
+    streaming = False  # Between SOS and EOS every completed transfer is one segment
+    got_code = False   # The code comes first; keep listening for the joke audio
     timeout_seconds = 30  # Timeout duration
+    idle_seconds = 10     # After a code, how long to wait for audio that may not come
 
     while True:
 
-        ready = select.select([sock], [], [], timeout_seconds)
+        wait = idle_seconds if got_code and not streaming else timeout_seconds
+        ready = select.select([sock], [], [], wait)
         if not ready[0]:  # If no data arrives within the timeout
-            print("Timeout: No data received within 5 seconds.")
+            if got_code:
+                return 0  # Code only (count / emotion commands send no audio)
+            print(f"Timeout: No data received within {timeout_seconds} seconds.")
             return -1  # Return -1 to indicate timeout
 
-        data, addr = sock.recvfrom(1032)  # 4-byte sequence number + 1024-byte chunk
-        
-        
-        # Save sender's address (only once)
-        if sender_addr is None:
-            sender_addr = addr
-
-        # Try decoding as text
-        try:
-            decoded_text = data.decode()
-            if decoded_text == "EOF":
-                break  # Stop receiving when EOF is detected
-            else:
-                print(f"Received text: {decoded_text}")  # Handle text messages
-                break
-        except UnicodeDecodeError:
-            pass  # Binary data detected → assume it's audio data
-
-        # Extract sequence number (first 4 bytes)
-        sequence_num = struct.unpack("!I", data[:4])[0]
-        chunk_data = data[4:]
-
-        # Store packet in buffer
-        buffer[sequence_num] = chunk_data
-        receiving = True
-
-    # Save received file if data was collected
-    if buffer and receiving:
-        sorted_data = [buffer[i] for i in sorted(buffer.keys())]
-        
-        # Generate unique filename
-        file_index = len(os.listdir(RECEIVED_FILE_DIR))
-        file_path = os.path.join(RECEIVED_FILE_DIR, f"received_audio_{file_index}.wav")
+        data, addr = receiver.receive()  # Reuses one preallocated buffer
+
+        if udp_transfer.is_transfer_packet(data):
+            audio = receiver.handle(data, addr)
+            if audio is not None:
+                save_audio(audio)
+                if not streaming:
+                    break
+            continue
+
+        decoded_text = bytes(data).decode(errors="replace")
+        if decoded_text == "SOS":
+            streaming = True
+        elif decoded_text == "EOS":
+            break
+        else:
+            print(f"Received text: {decoded_text}")  # Handle text messages
+            got_code = True
 
-        with open(file_path, "wb") as f:
-            for chunk in sorted_data:
-                f.write(chunk)
+def save_audio(audio):
+    """Write a received transfer to the next received_audio_N.wav."""
+    # Generate unique filename
+    file_index = len(os.listdir(RECEIVED_FILE_DIR))
+    file_path = os.path.join(RECEIVED_FILE_DIR, f"received_audio_{file_index}.wav")
 
-        print(f"Received and saved audio file: {file_path}")
-    else:
-        print("Received EOF but no data buffer found.")
+    with open(file_path, "wb") as f:
+        f.write(audio)
 
-    # Clear buffer for next file transfer
-    buffer.clear()
+    print(f"Received and saved audio file: {file_path}")
 
 def main():
     print("Type 'stop' to exit.")
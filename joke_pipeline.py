@@ -0,0 +1,209 @@
+"""
+Overlapped STT -> LLM -> TTS pipeline for one joke.
+
+Each stage runs on its own worker thread and talks to the next through a
+bounded queue, so the stages overlap instead of running back to back:
+
+  - STT streams the answer and hands every partial transcript to the LLM
+    stage as it changes, then the final one when the speaker stops.
+  - LLM starts classifying partials speculatively (stale ones are skipped)
+    and memoises by normalised text, so a final transcript that matches the
+    last partial is answered immediately.
+  - TTS renders the part of the joke that does not depend on the LLM
+    ("How we doing, {city}?") as soon as the transcript is final, and the
+    rest once the answer arrives. Audio goes to *on_audio* one sentence at a
+    time.
+
+    pipeline = JokePipeline(joke, style=1, on_answer=send_code, on_audio=play)
+    transcript, response = pipeline.run()
+"""
+import queue
+import threading
+import time
+
+import joke_templates
+import llm_cache
+import llm_client
+import sources
+import tts_engine
+
+_STOP = object()
+
+
+class Stage(object):
+    """One pipeline stage: a worker thread handling items from a bounded inbox."""
+
+    def __init__(self, name, handle, maxsize=4, on_error=None):
+        self.name = name
+        self.handle = handle
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.on_error = on_error
+        self.busy = 0.0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, item, block=True):
+        """Queue *item*; non-blocking puts are dropped when the stage is backed up."""
+        try:
+            self.inbox.put(item, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def backlog(self):
+        return self.inbox.qsize()
+
+    def stop(self):
+        try:
+            self.inbox.put(_STOP, timeout=1)
+        except queue.Full:
+            return  # Still busy; the daemon thread dies with the process
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                return
+            start = time.time()
+            try:
+                self.handle(item)
+            except Exception as e:
+                print(f"{self.name} stage failed: {e}")
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                self.busy += time.time() - start
+                self.items += 1
+
+
+class JokePipeline(object):
+
+    def __init__(self, joke, style, on_answer=None, on_audio=None, max_seconds=8, cancelled=None):
+        self.joke = joke
+        self.style = style
+        self.on_answer = on_answer
+        self.on_audio = on_audio
+        self.max_seconds = max_seconds
+        self.cancelled = cancelled
+        self.transcript = ""
+        self.response = None
+        self.error = None
+        self.marks = {}
+        self._answers = {}
+        self._done = threading.Event()
+        self.stt = Stage("stt", self._listen, maxsize=1, on_error=self._fail)
+        self.llm = Stage("llm", self._answer, maxsize=4, on_error=self._fail)
+        self.tts = Stage("tts", self._speak, maxsize=4, on_error=self._fail)
+        self.stages = (self.stt, self.llm, self.tts)
+
+    def _mark(self, name):
+        self.marks.setdefault(name, time.time() - self._start)
+
+    def _fail(self, error):
+        self.error = error
+        self._done.set()
+
+    def run(self, timeout=30):
+        """Listen, answer and speak; returns (transcript, response)."""
+        self._start = time.time()
+        streamer = self.joke.streamer()
+        streamer.on_partial = lambda text: self.llm.put(("partial", text), block=False)
+        for stage in self.stages:
+            stage.start()
+        self.stt.put(None)
+        deadline = self._start + timeout
+        try:
+            while not self._done.wait(0.1):
+                if self.cancelled is not None and self.cancelled.is_set():
+                    streamer.abort()  # Wake the STT stage instead of listening on
+                    break
+                if time.time() >= deadline:
+                    break
+        finally:
+            streamer.on_partial = None
+            for stage in self.stages:
+                stage.stop()
+        if self.error is not None:
+            raise self.error
+        self.report()
+        return self.transcript, self.response
+
+    # -- stages -----------------------------------------------------------
+    def _listen(self, _):
+        self.transcript = self.joke.listen_streaming(self.max_seconds)
+        self.joke.stt_result = self.transcript
+        self._mark("final transcript")
+        if not self.transcript:
+            self._done.set()
+            return
+        self.tts.put(("prefix", self.transcript))
+        self.llm.put(("final", self.transcript))
+
+    def _answer(self, item):
+        kind, text = item
+        if kind == "partial" and self.llm.backlog():
+            return  # A newer transcript is already queued
+        key = llm_cache.normalize(text)
+        if not key:
+            return
+        if key not in self._answers:
+            # Partials are guesses: answer them, but only the final transcript goes in the cache
+            self._answers[key] = self.joke.answer(text, store=(kind == "final"))[1]
+            self._mark("first LLM answer")
+        elif kind == "final" and self.joke.cache:
+            self.joke.cache.put(self.joke.joke_script, text, llm_client.get_client().model, self._answers[key])
+        if kind == "final":
+            self.response = self._answers[key]
+            self._mark("answer")
+            if self.on_answer is not None:
+                self.on_answer(self.response)
+            self.tts.put(("answer", text, self.response))
+
+    def _speak(self, item):
+        engine = tts_engine.get_engine()
+        if item[0] == "prefix":
+            prefix = joke_templates.fixed_prefix(self.style, item[1])
+            if prefix:
+                engine.synthesize(prefix)  # Lands in the TTS cache for the full joke
+                self._mark("prefix rendered")
+            return
+        _, subject, response = item
+        speech = joke_templates.render(self.style, subject, response.lower())
+        for segment in tts_engine.split_segments(speech):
+            if self.cancelled is not None and self.cancelled.is_set():
+                break
+            wav = engine.synthesize(segment)
+            self._mark("first audio")
+            if self.on_audio is not None:
+                self.on_audio(wav)
+        self._mark("done")
+        self._done.set()
+
+    def report(self):
+        print("-" * 60)
+        for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]):
+            print(f"{name:<20} {seconds:7.3f} s")
+        total = sum(stage.busy for stage in self.stages)
+        for stage in self.stages:
+            print(f"stage {stage.name:<14} {stage.busy:7.3f} s busy ({stage.items} items)")
+        print(f"sum of stages        {total:7.3f} s vs {self.marks.get('done', 0.0):.3f} s end to end")
+        print("-" * 60)
+
+
+def main():
+    # Offline run against a recorded answer: python joke_pipeline.py
+    from all_three_test import LLM_Joke
+    script = ("Based on the likely actual weather in {location} in the Winter, say an option "
+              "closest to the likely weather. SAY ONLY ONE WORD")
+    joke = LLM_Joke(script, options=list(joke_templates.WEATHER_OPTIONS),
+                    audio_source=sources.WavFileSource("test.wav", realtime=True))
+    print(JokePipeline(joke, style=1).run())
+
+
+if __name__ == "__main__":
+    main()
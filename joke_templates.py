@@ -0,0 +1,52 @@
+# Spoken joke templates, shared by pi_communication.make_joke and the
+# TTS pre-render command so both produce exactly the same sentence text.
+
+WEATHER_TEMPLATE = "How we doing, {subject}? I hear it's {response} here this time of year."
+
+PAY_TEMPLATES = {
+    "high": "This audience member has no idea what I’m talking about. Because with a {subject}’s pay, ladies are always wanting to flash their circuit boards.",
+    "low": "This audience member knows what I’m talking about! No one wants to show their circuit boards to someone with a {subject}’s pay. Me and you, buddy, me and you…",
+}
+
+WEATHER_OPTIONS = ("sunny", "warm", "overcast", "cloudy", "windy", "rainy", "stormy", "cold")
+PAY_OPTIONS = ("low", "high")
+
+# Inputs we hear most often at shows, used when no list is given to pre-render
+COMMON_LOCATIONS = (
+    "Portland", "Seattle", "San Francisco", "Los Angeles", "New York", "Chicago",
+    "Boston", "Denver", "Austin", "Eugene", "Salem", "Corvallis", "Bend",
+)
+COMMON_PROFESSIONS = (
+    "teacher", "engineer", "student", "nurse", "doctor", "lawyer", "programmer",
+    "barista", "professor", "accountant", "artist", "chef", "firefighter",
+)
+
+
+def render(style, subject, response):
+    if style == 1:
+        return WEATHER_TEMPLATE.format(subject=subject, response=response)
+    if style == 2:
+        return PAY_TEMPLATES[response].format(subject=subject)
+    raise ValueError(f"Unknown joke style: {style}")
+
+
+def fixed_prefix(style, subject):
+    """
+    Leading sentences of the joke that do not depend on the LLM answer, so
+    they can be synthesised while the LLM is still thinking ("" if none).
+    """
+    if style != 1:
+        return ""
+    head = WEATHER_TEMPLATE.partition("{response}")[0].format(subject=subject)
+    cut = max(head.rfind(mark) for mark in ".!?")
+    return head[:cut + 1].strip()
+
+
+def all_sentences(locations=COMMON_LOCATIONS, professions=COMMON_PROFESSIONS):
+    """Every sentence the robot can say for the given inputs."""
+    for location in locations:
+        for response in WEATHER_OPTIONS:
+            yield render(1, location, response)
+    for profession in professions:
+        for response in PAY_OPTIONS:
+            yield render(2, profession, response)
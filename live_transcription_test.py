@@ -1,48 +1,35 @@
-import queue
-import re
 import threading
 import time
 from typing import Dict, List
 
 import numpy as np
 import pyaudio
-from faster_whisper import WhisperModel
+
+from streaming_stt import StreamingTranscriber
 
 # Yeah I could do this config with argparse, but I won't...
 
 # Audio settings
-STEP_IN_SEC: int = 1    # We'll increase the processable audio data by this
-LENGHT_IN_SEC: int = 6    # We'll process this amount of audio data together maximum
+STEP_IN_SEC: float = 0.5    # Re-decode the unstable tail this often
 NB_CHANNELS = 1
 RATE = 16000
-CHUNK = RATE
+CHUNK = 1600    # 100 ms per read, fed straight into the ring buffer
 
 # Whisper settings
-WHISPER_LANGUAGE = "en"
-WHISPER_THREADS = 4
+WHISPER_MODEL = "tiny.en"
 
-# Visualization (expected max number of characters for LENGHT_IN_SEC audio)
+# Visualization (expected max number of characters for one line)
 MAX_SENTENCE_CHARACTERS = 80
 
-# This queue holds all the 1-second audio chunks
-audio_queue = queue.Queue()
-
-# This queue holds all the chunks that will be processed together
-# If the chunk is filled to the max, it will be emptied
-length_queue = queue.Queue(maxsize=LENGHT_IN_SEC)
-
-# Whisper model
-whisper = WhisperModel("tiny", device="cpu", compute_type="int8", cpu_threads=WHISPER_THREADS, download_root="./models")
 
-
-def producer_thread():
+def producer_thread(stt):
     audio = pyaudio.PyAudio()
     stream = audio.open(
         format=pyaudio.paInt16,
         channels=NB_CHANNELS,
         rate=RATE,
         input=True,
-        frames_per_buffer=CHUNK,    # 1 second of audio
+        frames_per_buffer=CHUNK,
     )
 
     print("-" * 80)
@@ -52,88 +39,38 @@ def producer_thread():
     print("-" * 80)
 
     while True:
-        audio_data = b""
-        for _ in range(STEP_IN_SEC):
-            chunk = stream.read(RATE)    # Read 1 second of audio data
-            audio_data += chunk
-
-        audio_queue.put(audio_data)    # Put the 5-second audio data into the queue
-
-
-# Thread which gets items from the queue and prints its length
-def consumer_thread(stats):
-    while True:
-        if length_queue.qsize() >= LENGHT_IN_SEC:
-            with length_queue.mutex:
-                length_queue.queue.clear()
-                print()
-
-        audio_data = audio_queue.get()
-        transcription_start_time = time.time()
-        length_queue.put(audio_data)
-
-        # Concatenate audio data in the lenght_queue
-        audio_data_to_process = b""
-        for i in range(length_queue.qsize()):
-            # We index it so it won't get removed
-            audio_data_to_process += length_queue.queue[i]
-
-        # convert the bytes data toa  numpy array
-        audio_data_array: np.ndarray = np.frombuffer(audio_data_to_process, np.int16).astype(np.float32) / 255.0
-        # audio_data_array = np.expand_dims(audio_data_array, axis=0)
-
-        segments, _ = whisper.transcribe(audio_data_array,
-                                         language=WHISPER_LANGUAGE,
-                                         beam_size=5,
-                                         vad_filter=True,
-                                         vad_parameters=dict(min_silence_duration_ms=1000))
-        segments = [s.text for s in segments]
-
-        transcription_end_time = time.time()
-
-        transcription = " ".join(segments)
-        # remove anything from the text which is between () or [] --> these are non-verbal background noises/music/etc.
-        transcription = re.sub(r"\[.*\]", "", transcription)
-        transcription = re.sub(r"\(.*\)", "", transcription)
-        # We do this for the more clean visualization (when the next transcription we print would be shorter then the one we printed)
-        transcription = transcription.ljust(MAX_SENTENCE_CHARACTERS, " ")
-
-        transcription_postprocessing_end_time = time.time()
-
-        print(transcription, end='\r', flush=True)
-
-        audio_queue.task_done()
-
-        overall_elapsed_time = transcription_postprocessing_end_time - transcription_start_time
-        transcription_elapsed_time = transcription_end_time - transcription_start_time
-        postprocessing_elapsed_time = transcription_postprocessing_end_time - transcription_end_time
-        stats["overall"].append(overall_elapsed_time)
-        stats["transcription"].append(transcription_elapsed_time)
-        stats["postprocessing"].append(postprocessing_elapsed_time)
+        chunk = stream.read(CHUNK, exception_on_overflow=False)
+        stt.feed(np.frombuffer(chunk, np.int16))
 
 
 if __name__ == "__main__":
-    stats: Dict[str, List[float]] = {"overall": [], "transcription": [], "postprocessing": []}
-
-    producer = threading.Thread(target=producer_thread)
+    stats: Dict[str, List[float]] = {"partial": [], "final": []}
+    last = [time.time()]
+
+    def show(kind):
+        def callback(text):
+            now = time.time()
+            stats[kind].append(now - last[0])
+            last[0] = now
+            if kind == "final":
+                print(text.ljust(MAX_SENTENCE_CHARACTERS, " "))
+            else:
+                print(text[-MAX_SENTENCE_CHARACTERS:].ljust(MAX_SENTENCE_CHARACTERS, " "), end='\r', flush=True)
+        return callback
+
+    stt = StreamingTranscriber(WHISPER_MODEL, step=STEP_IN_SEC, on_partial=show("partial"), on_final=show("final"))
+    stt.start()
+
+    producer = threading.Thread(target=producer_thread, args=(stt,), daemon=True)
     producer.start()
 
-    consumer = threading.Thread(target=consumer_thread, args=(stats,))
-    consumer.start()
-
     try:
         producer.join()
-        consumer.join()
     except KeyboardInterrupt:
         print("Exiting...")
+        stt.stop()
         # print out the statistics
-        print("Number of processed chunks: ", len(stats["overall"]))
-        print(f"Overall time: avg: {np.mean(stats['overall']):.4f}s, std: {np.std(stats['overall']):.4f}s")
-        print(
-            f"Transcription time: avg: {np.mean(stats['transcription']):.4f}s, std: {np.std(stats['transcription']):.4f}s"
-        )
-        print(
-            f"Postprocessing time: avg: {np.mean(stats['postprocessing']):.4f}s, std: {np.std(stats['postprocessing']):.4f}s"
-        )
-        # We need to add the step_in_sec to the latency as we need to wait for that chunk of audio
-        print(f"The average latency is {np.mean(stats['overall'])+STEP_IN_SEC:.4f}s")
\ No newline at end of file
+        print("Number of partial updates: ", len(stats["partial"]))
+        print("Number of final utterances: ", len(stats["final"]))
+        if stats["partial"]:
+            print(f"Partial update interval: avg: {np.mean(stats['partial']):.4f}s, std: {np.std(stats['partial']):.4f}s")
@@ -1,35 +1,24 @@
-import requests
-import json
 import time
 
-url = "http://localhost:11434/api/chat"
-
-def llama3(prompt):
-    data = {
-        "model": "llama3.2",
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
+from llm_client import OllamaClient
 
-            }
-        ],
-        "stream": False,
-    }
+url = "http://localhost:11434/api/chat"
+client = OllamaClient(url=url, model="llama3.2")
 
-    headers = {
-        "Content-Type": "application/json"
-    }
+def llama3(prompt, options=None):
     start = time.time()
-    response = requests.post(url, headers=headers, json=data)
+    if options:
+        response, _ = client.first_match(prompt, options)
+    else:
+        response = client.chat(prompt)
     print(time.time() - start)
-    return response.json()['message']['content']
+    return response
 
 if __name__ == "__main__":
     date = "Winter"
     location = "Portland, OR"
     request = f"Based on the likely actual weather in {location} in the {date}, say an option closest to the likely weather. ONLY SAY ONE OF THESE OPTIONS AND NOTHING MORE (Sunny, Cold, Rainy, Stormy, Overcast). SAY ONLY ONE WORD"
-    response = llama3(request)
+    response = llama3(request, options=["Sunny", "Cold", "Rainy", "Stormy", "Overcast"])
     print(request)
     print(response)
 
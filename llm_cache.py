@@ -0,0 +1,136 @@
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB = "llm_cache.sqlite3"
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "florida": "fl", "georgia": "ga",
+    "hawaii": "hi", "idaho": "id", "illinois": "il", "indiana": "in", "iowa": "ia",
+    "kansas": "ks", "kentucky": "ky", "louisiana": "la", "maine": "me", "maryland": "md",
+    "massachusetts": "ma", "michigan": "mi", "minnesota": "mn", "mississippi": "ms",
+    "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv", "new hampshire": "nh",
+    "new jersey": "nj", "new mexico": "nm", "new york": "ny", "north carolina": "nc",
+    "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or", "pennsylvania": "pa",
+    "rhode island": "ri", "south carolina": "sc", "south dakota": "sd", "tennessee": "tn",
+    "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va", "washington": "wa",
+    "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+_STATE_RE = re.compile(r"\b(" + "|".join(sorted(US_STATES, key=len, reverse=True)) + r")\b")
+_FILLER_RE = re.compile(r"\b(i'm|im|i am|from|a|an|the|um|uh|i work as|i'm a|my job is)\b")
+
+
+def normalize(text):
+    """
+    Fold STT output into a cache key: case, punctuation and filler words are
+    dropped and US state names become their postal code, so "Portland,
+    Oregon." and "portland OR" share one entry.
+    """
+    text = text.lower()
+    text = _FILLER_RE.sub(" ", text)
+    text = re.sub(r"[^a-z0-9' ]+", " ", text)
+    text = _STATE_RE.sub(lambda m: US_STATES[m.group(1)], text)
+    return " ".join(text.split())
+
+
+class LLMCache(object):
+    """
+    Persistent SQLite cache of LLM answers keyed by (template, normalized
+    transcript, model), with an in-memory front so repeat hits never touch
+    the disk. Entries expire after *ttl* seconds and the least recently used
+    ones are evicted beyond *max_entries*.
+    """
+
+    def __init__(self, path=DEFAULT_DB, max_entries=5000, ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = {}
+        self._touched = {}  # Memory hits not yet written to last_used
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " template TEXT, text TEXT, model TEXT, answer TEXT,"
+            " created REAL, last_used REAL,"
+            " PRIMARY KEY (template, text, model))"
+        )
+        self._db.commit()
+
+    def get(self, template, text, model):
+        key = (template, normalize(text), model)
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and now - entry[1] < self.ttl:
+            # Recency is written on the next disk access, before any eviction
+            self._touched[key] = now
+            return entry[0]
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer, created FROM answers WHERE template=? AND text=? AND model=?", key
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._db.execute("DELETE FROM answers WHERE template=? AND text=? AND model=?", key)
+                self._db.commit()
+                self._memory.pop(key, None)
+                return None
+            self._db.execute(
+                "UPDATE answers SET last_used=? WHERE template=? AND text=? AND model=?", (now,) + key
+            )
+            self._db.commit()
+        self._memory[key] = (row[0], row[1])
+        return row[0]
+
+    def put(self, template, text, model, answer):
+        key = (template, normalize(text), model)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)", key + (answer, now, now)
+            )
+            self._flush_touched()
+            self._evict()
+            self._db.commit()
+        self._memory[key] = (answer, now)
+
+    def _flush_touched(self):
+        touched, self._touched = self._touched, {}
+        self._db.executemany(
+            "UPDATE answers SET last_used=MAX(last_used, ?) WHERE template=? AND text=? AND model=?",
+            [(when,) + key for key, when in touched.items()]
+        )
+
+    def _evict(self):
+        self._db.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM answers WHERE rowid IN "
+                "(SELECT rowid FROM answers ORDER BY last_used LIMIT ?)", (count - self.max_entries,)
+            )
+            self._memory.clear()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+        self._memory.clear()
+        self._touched.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide shared cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+    return _default_cache
@@ -0,0 +1,186 @@
+"""
+LLM backends behind one small interface.
+
+A backend has a `model` name and chat(prompt), stream(prompt) (a generator
+of text fragments) and classify(prompt, options); first_match() is built on
+stream(). cache_prefix(text) hints that many prompts will start with *text*
+so a backend that can keep its evaluated state (llama.cpp) does so.
+
+    ollama[:model]            Ollama server over HTTP (default)
+    llamacpp:path/model.gguf  in-process llama.cpp, see llm_llamacpp.py
+
+The process-wide backend comes from get_client(), chosen by LLM_BACKEND;
+LLAMA_THREADS, LLAMA_CTX and LLAMA_CHAT_FORMAT configure llama.cpp.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import startup
+
+OLLAMA_URL = "http://localhost:11434/api/chat"
+DEFAULT_MODEL = "qwen3:1.7b"
+
+_THINK_RE = re.compile(r"<think>.*?(</think>|$)", re.S)
+_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+class LLMBackend(object):
+    """Shared behaviour; subclasses provide chat(), stream() and classify()."""
+
+    model = None
+
+    def cache_prefix(self, text):
+        pass
+
+    def first_match(self, prompt, options, **kwargs):
+        """
+        Stream a completion and return the first whole word that is one of
+        *options* (case-insensitive), closing the stream as soon as it is seen
+        so the model stops generating. Text inside <think> blocks is ignored.
+        Returns (option, raw_text); option is None if nothing matched.
+        """
+        lookup = {o.lower(): o for o in options}
+        text = ""
+        start = time.time()
+        gen = self.stream(prompt, **kwargs)
+        try:
+            for fragment in gen:
+                text += fragment
+                match = _match_option(_THINK_RE.sub("", text), lookup, final=False)
+                if match:
+                    print(f"LLM decision after {time.time() - start:.3f}s")
+                    return match, text
+        finally:
+            gen.close()  # Stops generation (Ollama: drops the connection)
+        return _match_option(_THINK_RE.sub("", text), lookup, final=True), text
+
+
+class OllamaClient(LLMBackend):
+    """
+    Thin Ollama /api/chat client on a pooled keep-alive session.
+
+    One instance is meant to live for the whole process so every request
+    reuses the same TCP connection instead of opening a new one.
+    """
+
+    def __init__(self, url=OLLAMA_URL, model=DEFAULT_MODEL, keep_alive="30m", pool_size=4, timeout=60):
+        self.url = url
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        # requests is only imported when the Ollama backend is actually used
+        self.session = startup.load("requests").Session()
+        adapter = startup.load("requests.adapters").HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def _payload(self, prompt, stream, model=None, num_predict=None, stop=None,
+                 keep_alive=None, think=None, temperature=None, format=None):
+        options = {}
+        if num_predict is not None:
+            options["num_predict"] = num_predict
+        if stop:
+            options["stop"] = list(stop)
+        if temperature is not None:
+            options["temperature"] = temperature
+        data = {
+            "model": model or self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": stream,
+            "keep_alive": keep_alive if keep_alive is not None else self.keep_alive,
+        }
+        if options:
+            data["options"] = options
+        if think is not None:
+            data["think"] = think
+        if format is not None:
+            data["format"] = format
+        return data
+
+    def chat(self, prompt, **kwargs):
+        """Blocking, non-streamed completion. Returns the full message text."""
+        response = self.session.post(self.url, json=self._payload(prompt, False, **kwargs), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['message']['content']
+
+    def stream(self, prompt, **kwargs):
+        """Yield content fragments as Ollama produces them."""
+        with self.session.post(self.url, json=self._payload(prompt, True, **kwargs),
+                               stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                content = chunk.get("message", {}).get("content", "")
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    break
+
+    def classify(self, prompt, options, **kwargs):
+        """
+        Pick exactly one of *options* in a single constrained decode. The
+        reply is forced through a JSON schema whose only field is an enum of
+        the options, so the model cannot ramble or answer off-list.
+        """
+        schema = {
+            "type": "object",
+            "properties": {"answer": {"type": "string", "enum": list(options)}},
+            "required": ["answer"],
+        }
+        kwargs.setdefault("think", False)
+        kwargs.setdefault("temperature", 0)
+        kwargs.setdefault("num_predict", 32)
+        prompt = f"{prompt}\nRespond with JSON of the form {{\"answer\": <one of {', '.join(options)}>}}."
+        text = self.chat(prompt, format=schema, **kwargs)
+        try:
+            answer = json.loads(text)["answer"]
+        except (ValueError, KeyError, TypeError):
+            answer = _match_option(text, {o.lower(): o for o in options}, final=True)
+        # The schema makes an off-list answer very unlikely; fall back to the
+        # first option rather than failing the whole joke.
+        return answer if answer in options else options[0]
+
+
+def _match_option(text, lookup, final):
+    words = list(_WORD_RE.finditer(text))
+    for i, word in enumerate(words):
+        key = word.group().lower()
+        if key not in lookup:
+            continue
+        # A trailing word may still be growing ("Sun" -> "Sunny"), so only
+        # take it early if no other option could extend it.
+        complete = final or i < len(words) - 1 or word.end() < len(text)
+        if complete or not any(o != key and o.startswith(key) for o in lookup):
+            return lookup[key]
+    return None
+
+
+def make_client(spec):
+    kind, _, arg = spec.partition(":")
+    if kind == "ollama":
+        return OllamaClient(model=arg or DEFAULT_MODEL)
+    if kind == "llamacpp":
+        from llm_llamacpp import LlamaCppClient
+        return LlamaCppClient(arg, n_threads=int(os.getenv("LLAMA_THREADS", "0")) or None,
+                              n_ctx=int(os.getenv("LLAMA_CTX", "1024")),
+                              chat_format=os.getenv("LLAMA_CHAT_FORMAT", "chatml"))
+    raise ValueError(f"Unknown LLM backend: {spec}")
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide shared backend, chosen by LLM_BACKEND (default: Ollama)."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = make_client(os.getenv("LLM_BACKEND", "ollama"))
+    return _default_client
@@ -0,0 +1,125 @@
+"""
+In-process llama.cpp backend (llama-cpp-python).
+
+The GGUF is loaded once per process, so a request costs no HTTP round trip
+and no JSON encoding. The fixed start of our prompts (the chat header plus
+the joke_script text before "{location}") is evaluated once by
+cache_prefix() and its KV state kept; each request restores that state and
+only evaluates the few transcript tokens that follow. classify() constrains
+decoding with a GBNF grammar of the allowed options, so the answer is one of
+them after a handful of tokens.
+
+    LLM_BACKEND=llamacpp:models/qwen3-1.7b-q4_k_m.gguf LLAMA_THREADS=4 python all_three_test.py
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import startup
+from llm_client import LLMBackend, _match_option
+
+# Prompt wrapping per model family: (template, stop strings, text that
+# disables thinking for models that support it)
+CHAT_FORMATS = {
+    "chatml": ("<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n", ("<|im_end|>",),
+               "<think>\n\n</think>\n\n"),
+    "gemma": ("<start_of_turn>user\n{prompt}<end_of_turn>\n<start_of_turn>model\n", ("<end_of_turn>",), ""),
+    "llama3": ("<|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|>"
+               "<|start_header_id|>assistant<|end_header_id|>\n\n", ("<|eot_id|>",), ""),
+}
+
+
+class LlamaCppClient(LLMBackend):
+
+    def __init__(self, model_path, n_threads=None, n_ctx=1024, n_batch=256, chat_format="chatml",
+                 max_prefixes=8, verbose=False):
+        llama_cpp = startup.load("llama_cpp")
+        start = time.time()
+        self.llm = llama_cpp.Llama(model_path=model_path, n_ctx=n_ctx, n_batch=n_batch,
+                                   n_threads=n_threads, n_threads_batch=n_threads, verbose=verbose)
+        startup.record("llama.cpp model load", time.time() - start)
+        print(f"Loaded {model_path} in {time.time() - start:.2f}s")
+        self.model = os.path.basename(model_path)
+        self.template, self.stop, self.no_think = CHAT_FORMATS[chat_format]
+        self.max_prefixes = max_prefixes
+        self._prefixes = OrderedDict()  # Formatted prefix text -> saved KV state
+        self._grammars = {}
+        self._lock = threading.Lock()
+
+    def _format(self, prompt, think=None):
+        text = self.template.format(prompt=prompt)
+        return text + self.no_think if think is False else text
+
+    def cache_prefix(self, text):
+        """Evaluate the chat header plus *text* once and keep its KV state."""
+        prefix = self.template.partition("{prompt}")[0] + text
+        if prefix in self._prefixes:
+            return
+        with self._lock:
+            start = time.time()
+            self.llm.reset()
+            self.llm.eval(self.llm.tokenize(prefix.encode(), add_bos=True, special=True))
+            self._prefixes[prefix] = self.llm.save_state()
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        print(f"Cached prompt prefix ({self._prefixes[prefix].n_tokens} tokens) in {time.time() - start:.2f}s")
+
+    def _restore_prefix(self, text):
+        # Longest cached prefix of this prompt; loaded only if the context
+        # does not already start with it (e.g. after a different joke style)
+        matches = [p for p in self._prefixes if text.startswith(p)]
+        if not matches:
+            return
+        prefix = max(matches, key=len)
+        self._prefixes.move_to_end(prefix)
+        state = self._prefixes[prefix]
+        cached = state.input_ids[:state.n_tokens].tolist()
+        current = self.llm._input_ids.tolist()
+        if self.llm.longest_token_prefix(current, cached) < len(cached):
+            self.llm.load_state(state)
+
+    def _completion(self, prompt, stream, num_predict=None, stop=None, temperature=None,
+                    think=None, grammar=None, **_):
+        # Ollama-only options (keep_alive, format, model) are accepted and ignored
+        text = self._format(prompt, think)
+        self._restore_prefix(text)
+        kwargs = {"max_tokens": num_predict or 256, "stop": list(self.stop) + list(stop or ()),
+                  "stream": stream, "grammar": grammar}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        # llama.cpp reuses the evaluated tokens shared with the prompt, so
+        # only the part after the cached prefix is prefilled here
+        return self.llm.create_completion(text, **kwargs)
+
+    def chat(self, prompt, **kwargs):
+        with self._lock:
+            return self._completion(prompt, False, **kwargs)["choices"][0]["text"]
+
+    def stream(self, prompt, **kwargs):
+        with self._lock:
+            for chunk in self._completion(prompt, True, **kwargs):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+    def _grammar(self, options):
+        key = tuple(options)
+        grammar = self._grammars.get(key)
+        if grammar is None:
+            rule = "root ::= " + " | ".join(json.dumps(option) for option in options)
+            grammar = self._grammars[key] = startup.load("llama_cpp").LlamaGrammar.from_string(rule, verbose=False)
+        return grammar
+
+    def classify(self, prompt, options, **kwargs):
+        """Pick one of *options*; a GBNF grammar makes anything else undecodable."""
+        kwargs.setdefault("think", False)
+        kwargs.setdefault("temperature", 0)
+        kwargs.setdefault("num_predict", 16)
+        prompt = f"{prompt}\nAnswer with one of: {', '.join(options)}."
+        text = self.chat(prompt, grammar=self._grammar(options), **kwargs).strip()
+        if text in options:
+            return text
+        answer = _match_option(text, {o.lower(): o for o in options}, final=True)
+        return answer if answer in options else options[0]
@@ -1,248 +1,279 @@
 import socket
+import threading
 import time
 import os
-import struct
-import subprocess
+from collections import deque
 import numpy as np
+import joke_templates
+import stt_models
+import tts_engine
+import face_analysis
+import udp_transfer
+from audience_monitor import AudienceMonitor
+from vision_engine import VisionEngine, mean_face_count, emotion_totals, dominant
 from all_three_test import LLM_Joke
-from deepface import DeepFace
-from picamera2 import Picamera2, Preview
+from joke_pipeline import JokePipeline
+import sources
+import startup
 
 #NAO_IP = '10.42.0.36'       # Actual NAO IP
 NAO_IP = '10.42.0.179'      # Computer IP
 PI_IP = '10.42.0.1'
 PORT = 2033
+AUDIO_PAYLOAD = udp_transfer.DEFAULT_PAYLOAD  # Bytes of audio per datagram, fits a 1500-byte MTU
+CAPTURE_SIZE = (640, 480)   # Frame size handed to the emotion model
+DETECT_SIZE = (320, 240)    # lores stream size used by the face detector
+CAMERA_SOURCES = os.getenv("PI_CAMERAS", "picam:0,picam:1")  # e.g. "video:show.mp4,synthetic"
+STREAM_TTS = True           # Send jokes sentence by sentence as they are synthesized
+PIPELINED_JOKES = True      # Overlap STT, LLM and TTS on their own threads (joke_pipeline)
 
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
 sock.bind((PI_IP, PORT)) 
 start = time.time()
+pending_messages = deque()  # Commands received while an audio transfer was running
+joke_lock = threading.Lock()  # One joke at a time: they share the mic and the streaming transcriber
 
-picam0 = Picamera2(0)
-picam1 = Picamera2(1)
+cameras = {}  # Opened by cam_initializer(), not at import
+vision = None
+monitor = None
+trackers = {}
+VISION_WORKERS = 2          # Analysis threads shared by both cameras
+INCREMENTAL_VISION = True   # Skip unchanged frames and track faces between full detections
 
 def send_message(message, target_ip):
     sock.sendto(message.encode(), (target_ip, PORT))
     print(f"Sent message: {message}")
 
-def send_message_audio(file_path, target_ip):
+def send_audio_bytes(data, target_ip, transfer_sock=None):
+    # Windowed transfer with NACK-based retransmission, returns once the robot ACKs.
+    # Commands that arrive mid-transfer on the main socket are queued for
+    # receive_message(); a separate transfer_sock keeps the ACKs off it entirely.
+    udp_transfer.send_reliable(transfer_sock or sock, data, (target_ip, PORT), payload_size=AUDIO_PAYLOAD,
+                               on_other=lambda msg, addr: pending_messages.append((msg, addr)))
+
+def send_message_audio(file_path, target_ip, transfer_sock=None):
     try:
         with open(file_path, 'rb') as audio_file:
-            sequence_num = 0
-            while chunk := audio_file.read(1024):
-                packet = struct.pack("!I", sequence_num) + chunk  # Add sequence number (4 bytes)
-                sock.sendto(packet, (target_ip, PORT))
-                sequence_num += 1
-
-            # Send EOF
-            sock.sendto(b'EOF', (target_ip, PORT))  
+            send_audio_bytes(audio_file.read(), target_ip, transfer_sock)
             print(f"Sent audio file: {file_path}")
             
         os.remove(file_path)  # Optional: Remove file after sending
     except Exception as e:
         print(f"Error sending audio file: {e}")
 
+def send_speech_streaming(speech, target_ip, transfer_sock=None, cancelled=None, reply=None):
+    """
+    Send the joke one sentence at a time as each is synthesized. Every
+    sentence is a complete WAV transfer, and the whole joke is wrapped in
+    SOS/EOS markers so the robot can start playing the first one straight
+    away.
+    """
+    if reply is None:
+        reply = lambda text: send_message(text, target_ip)
+    segments = tts_engine.get_engine().stream(speech)
+    try:
+        start_send = time.time()
+        reply("SOS")
+        for i, wav in enumerate(segments):
+            if cancelled is not None and cancelled.is_set():
+                break
+            send_audio_bytes(wav, target_ip, transfer_sock)
+            if i == 0:
+                print(f"First segment sent after {time.time() - start_send:.3f}s")
+        reply("EOS")
+        print(f"Streamed speech in {time.time() - start_send:.3f}s")
+    except Exception as e:
+        print(f"Error streaming speech: {e}")
+    finally:
+        segments.close()  # Stops the render thread if we broke off early
+
 def receive_message():
-    data, addr = sock.recvfrom(1024)
+    while True:
+        if pending_messages:
+            data, addr = pending_messages.popleft()
+        else:
+            data, addr = sock.recvfrom(1024)
+        # Late DONE/STATUS replies from a finished transfer are not commands
+        if not udp_transfer.is_transfer_packet(data):
+            break
     message = data.decode()
     print(f"Received message: {message} from {addr}")
     return message
 
 def cam_initializer():
-    config0 = picam0.create_preview_configuration()
-    config1 = picam1.create_preview_configuration()
-
-    picam0.configure(config0)
-    picam1.configure(config1)
-
-    picam0.start()
-    picam1.start()
+    # picam sources use a small BGR main stream for emotion, a lores Y plane for
+    # detection and pooled buffers; see sources.py for file/synthetic backends
+    start_cams = time.time()
+    for i, spec in enumerate(CAMERA_SOURCES.split(",")):
+        camera = sources.make_camera(spec.strip(), main_size=CAPTURE_SIZE, lores_size=DETECT_SIZE)
+        camera.configure()
+        cameras[f"Camera {i}"] = camera
+    startup.record("cameras", time.time() - start_cams)
+
+def cam_close():
+    if vision is not None:
+        vision.stop()
+    for camera in cameras.values():
+        camera.close()
+
+def get_vision():
+    # Capture threads and analysis workers are started once and reused
+    global vision
+    if vision is None:
+        vision = VisionEngine(cameras, face_analysis.count_only, workers=VISION_WORKERS)
+        vision.start()
+    return vision
+
+def get_analyzer(emotion):
+    """Analysis function for a scan, incremental per camera if enabled."""
+    if not INCREMENTAL_VISION:
+        return face_analysis.with_emotion if emotion else face_analysis.count_only
+    key = "emotion" if emotion else "count"
+    if key not in trackers:
+        # Skips static frames and re-uses face boxes between full passes
+        trackers[key] = face_analysis.incremental(get_vision().cameras, emotion=emotion)
+    return trackers[key]
+
+def start_monitor(fps=3, window=6.0, decay=2.0, emotion_every=3):
+    """Keep a rolling audience estimate up to date in the background."""
+    global monitor
+    if monitor is None:
+        if INCREMENTAL_VISION:
+            analyzer = get_analyzer(emotion=True)
+        else:
+            # Cheap detector on every frame, emotion model on every emotion_every-th
+            analyzer = face_analysis.FaceAnalyzer(emotion_every=emotion_every)
+        monitor = AudienceMonitor(get_vision(), fps=fps, window=window, decay=decay, analyze=analyzer)
+    monitor.start()
+    return monitor
 
 def num_faces(fps=15, time_check=2):
-    frame_interval = 1.0 / fps
-    start_call = time.time()
-    faces_arr = []
-    while True:
-        start_time = time.time()
-        total_faces = 0
-        
-        # Capture a frame
-        frame0 = picam0.capture_array()
-        frame1 = picam1.capture_array()
+    if monitor is not None and monitor.running and monitor.wait_ready():
+        # Answer from the rolling window instead of a fresh blocking scan
+        return np.round(monitor.snapshot().faces)
+    engine = get_vision()
+    # Detector only, the emotion model is not needed to count faces
+    results = engine.sample(duration=time_check, fps=fps, analyze=get_analyzer(emotion=False))
+    # Amount of faces found in frame from both cameras combines
+    return np.round(mean_face_count(results, engine.cameras))
 
-        try:
-            analysis_results = DeepFace.analyze(frame0, actions=("emotion",), enforce_detection=False)
-            if analysis_results:
-                total_faces += len(analysis_results)
-
-        except Exception as e:
-            print(f"Error during face finding (Camera 0): {e}")
-            
-        try:
-            analysis_results = DeepFace.analyze(frame1, actions=("emotion",), enforce_detection=False)
-            if analysis_results:
-                total_faces += len(analysis_results)
+def dom_emotion(fps=15, time_check=2):
+    if monitor is not None and monitor.running and monitor.wait_ready():
+        return monitor.snapshot().dominant_emotion
+    results = get_vision().sample(duration=time_check, fps=fps, analyze=get_analyzer(emotion=True))
+    return dominant(emotion_totals(results))
 
-        except Exception as e:
-            print(f"Error during face finding (Camera 1): {e}")
-            
-        # Amount of faces found in frame from both cameras combines
-        faces_arr.append(total_faces)
+def make_joke(joke, response, style):
+    return joke_templates.render(style, joke.stt_result, response)
 
-        # Wait until next frame based on FPS
-        elapsed_time = time.time() - start_time
-        if elapsed_time < frame_interval:
-            time.sleep(frame_interval - elapsed_time)
-            
-        elapsed_total = time.time() - start_call
-        if elapsed_total > time_check:
-            break
-    
-    return np.round(sum(faces_arr)/len(faces_arr))
 
-def dom_emotion(fps=15, time_check=2):
-    frame_interval = 1.0 / fps
-    start_call = time.time()
-    emotion_dict = {'sad':0,'happy':0,'angry':0,'neutral':0,'surprise':0,'disgust':0,'fear':0}
-    while True:
-        start_time = time.time()
-        
-        # Capture a frame
-        frame0 = picam0.capture_array()
-        frame1 = picam1.capture_array()
+def piper_tts(speech, filename):
+    # Voice stays loaded between jokes and repeated sentences come from the cache
+    return tts_engine.get_engine().synthesize_to_file(speech, filename)
 
-        try:
-            analysis_results = DeepFace.analyze(frame0, actions=("emotion",), enforce_detection=False)
-            if analysis_results:
-                for analysis in analysis_results:
-                    for key, value in analysis['emotion'].items():
-                        emotion_dict[key] += value
-
-        except Exception as e:
-            print(f"Error during emotion detection (Camera 0): {e}")
-            
-        try:
-            analysis_results = DeepFace.analyze(frame1, actions=("emotion",), enforce_detection=False)
-            if analysis_results:
-                for analysis in analysis_results:
-                    for key, value in analysis['emotion'].items():
-                        emotion_dict[key] += value
-
-        except Exception as e:
-            print(f"Error during emotion detection (Camera 1): {e}")
-
-        # Wait until next frame based on FPS
-        elapsed_time = time.time() - start_time
-        if elapsed_time < frame_interval:
-            time.sleep(frame_interval - elapsed_time)
-        
-        elapsed_total = time.time() - start_call
-        if elapsed_total > time_check:
-            break
-    
-    dominant_emotion = ''
-    max_val = 0
-    for key, value in emotion_dict:
-        if value > max_val:
-            max_val = value
-            dominant_emotion = key
-            
-    return dominant_emotion
 
-def make_joke(joke, response, style):
-    filename = "response.wav"
-    if style == 1:
-        speech = f"How we doing, {joke.stt_result}? I hear it's {response} here this time of year."
-    if style == 2:
-        if response == "high":
-            speech = f"This audience member has no idea what I’m talking about. Because with a {joke.stt_result}’s pay, ladies are always wanting to flash their circuit boards."
-        if response == "low":
-            speech = f"This audience member knows what I’m talking about! No one wants to show their circuit boards to someone with a {joke.stt_result}’s pay. Me and you, buddy, me and you…"
+# Allowed LLM answers for each joke style and the code sent back to the NAO
+WEATHER_CODES = {"sunny": "0", "warm": "0", "overcast": "1", "cloudy": "1", "windy": "2", "rainy": "3", "stormy": "4", "cold": "5"}
+PAY_CODES = {"low": "0", "high": "1"}
 
-    return speech
+def run_joke_pipeline(joke, style, codes, reply, cancelled=None, transfer_sock=None):
+    """Answer code goes out as soon as the LLM has it, then each sentence as it is rendered."""
+    def on_answer(response):
+        # SOS/EOS go through reply too, so they follow the code and carry its request ID
+        reply(codes[response.lower()])
+        reply("SOS")
 
+    robot_gone = []
 
-def piper_tts(speech, filename):
-    #command = f"echo \"{speech}\" | piper --model en_US-lessac-medium --output_file {filename}"
-    command = f"echo \"{speech}\" | piper --model ~/comedy-robot-strategies/piper/joey7999.onnx --output_file {filename}"
-    subprocess.run(command, shell=True, check=True)
-    return filename
-    
+    def on_audio(wav):
+        if robot_gone:
+            return
+        try:
+            send_audio_bytes(wav, NAO_IP, transfer_sock)
+        except TimeoutError as e:
+            # Robot stopped acknowledging; drop the rest rather than wait out every segment
+            print(f"Error sending audio: {e}")
+            robot_gone.append(e)
 
-def execute_command(message):
+    pipeline = JokePipeline(joke, style, on_answer=on_answer, cancelled=cancelled, on_audio=on_audio)
+    try:
+        pipeline.run()
+    except Exception as e:
+        print(f"Joke pipeline failed: {e}")
+    finally:
+        if pipeline.response is None:
+            # Nothing heard, timed out or failed before an answer; the robot still needs a code
+            reply("-1")
+        else:
+            reply("EOS")
+
+
+def execute_command(message, reply=None, cancelled=None, transfer_sock=None):
+    """
+    Run one NAO command. *reply* sends the short answer (defaults to a plain
+    message to the NAO), *cancelled* is an optional threading.Event checked
+    between stages, and *transfer_sock* is used for audio instead of the
+    main socket when given.
+    """
+    if reply is None:
+        reply = lambda text: send_message(text, NAO_IP)
     message_arr = message.split(" ")
     if message == "start count":
         print("Starting process")
         num_people = num_faces(fps=15, time_check=2)
         print("{} people seen".format(num_people))
         if num_people >= 10:
-            send_message("1", NAO_IP)
+            reply("1")
         elif num_people >= 5:
-            send_message("0", NAO_IP)
+            reply("0")
         else:
-            send_message("-1", NAO_IP)
+            reply("-1")
     
     if message == "start emotion":
         print("Starting process")
         dominant_emotion = dom_emotion(fps=15, time_check=2)
-        print("{} is dominant emotion".format(num_people))
+        print("{} is dominant emotion".format(dominant_emotion))
         if dominant_emotion in ('happy', 'surprise', 'fear'):
-            send_message("1", NAO_IP)
-        elif dominant_emotion in ('neutral'):
-            send_message("0", NAO_IP)
+            reply("1")
+        elif dominant_emotion == 'neutral':
+            reply("0")
         else:
-            send_message("-1", NAO_IP)
+            reply("-1")
 
     if len(message_arr) > 2:
         print("Starting process")
         if message_arr[2] == "1":
             joke_script = "Based on the likely actual weather in {location} in the Winter, say an option closest to the likely weather (Sunny, Cold, Rainy, Stormy, Overcast, Warm, Windy). SAY ONLY ONE WORD"
-            joke = LLM_Joke(joke_script=joke_script)
-            response_text = joke.main().lower()
-            if response_text in ("sunny", "warm"):
-                send_message("0", NAO_IP)
-            elif response_text in ("cloudy", "overcast"):
-                send_message("1", NAO_IP)
-            elif response_text in ("windy"):
-                send_message("2", NAO_IP)
-            elif response_text in ("rainy"):
-                send_message("3", NAO_IP)
-            elif response_text in ("stormy"):
-                send_message("4", NAO_IP)
-            elif response_text in ("cold"):
-                send_message("5", NAO_IP)
-            else:
-                send_message("-1", NAO_IP)
-                return
-            
-            filename = "response.wav"
-            speech = make_joke(joke=joke, response=response_text, style=1)
-            piper_tts(speech, filename)
-            send_message_audio(filename, NAO_IP)
-            
-        
+            codes = WEATHER_CODES
+            style = 1
         elif message_arr[2] == "2":
             joke_script = "Is the {profession} a high-paying or low-paying profession. Choose between (high, low). SAY ONLY ONE WORD"
-            joke = LLM_Joke(joke_script=joke_script)
+            codes = PAY_CODES
+            style = 2
+        else:
+            return
+
+        # Constrained classification always lands on one of the codes' keys
+        joke = LLM_Joke(joke_script=joke_script, options=list(codes))
+        with joke_lock:
+            if PIPELINED_JOKES:
+                run_joke_pipeline(joke, style, codes, reply, cancelled, transfer_sock)
+                return
             response_text = joke.main().lower()
-            if response_text in ("low"):
-                send_message("0", NAO_IP)
-            elif response_text in ("high"):
-                send_message("1", NAO_IP)
-            else:
-                send_message("-1", NAO_IP)
+            if cancelled is not None and cancelled.is_set():
                 return
-            
-            filename = "response.wav"
-            speech = make_joke(joke=joke, response=response_text, style=2)
-            piper_tts(speech, filename)
-            send_message_audio(filename, NAO_IP)
+            reply(codes[response_text])
 
+            speech = make_joke(joke=joke, response=response_text, style=style)
+            if STREAM_TTS:
+                send_speech_streaming(speech, NAO_IP, transfer_sock, cancelled, reply)
+            else:
+                filename = "response.wav"
+                piper_tts(speech, filename)
+                send_message_audio(filename, NAO_IP, transfer_sock)
 
-        else:
-            return
-        
-    
     if message == "end":
         print("Ending process")
 
@@ -250,8 +281,15 @@ def execute_command(message):
 
 #send_message("start", NAO_IP)
 
-def main():
+def main(warm_up=True, background_monitor=True):
     cam_initializer()
+    if background_monitor:
+        start_monitor()
+    if warm_up:
+        # Load models in the background so we are listening straight away
+        startup.warm_in_background(("whisper", stt_models.warm_up),
+                                   ("emotion model", face_analysis.preload))
+    startup.report()
     while True:
         print("waiting for message")
         message = receive_message()
@@ -259,8 +297,7 @@ def main():
         if message == "end":
             print(time.time()-start)
             break
-    picam0.close()
-    picam1.close()
+    cam_close()
     
 if __name__=="__main__":
     main()
@@ -0,0 +1,162 @@
+"""
+asyncio front end for pi_communication.
+
+The command socket is owned by an event loop, so new datagrams are read
+while a vision scan or a joke is still running. Heavy commands are handed
+to a thread pool; "status" and "cancel" are answered straight from the loop.
+
+Commands may carry a request ID as "#<id> <command>"; replies to them are
+prefixed the same way so the NAO can match answers to requests. Commands
+without an ID behave exactly as with pi_communication.main().
+
+    #7 start count      -> #7 1
+    #8 status           -> #8 running 7:start count
+    #9 cancel 7         -> #9 cancelled 7   (and #7 cancelled)
+"""
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pi_communication as pc
+import startup
+import stt_models
+import udp_transfer
+
+
+def parse_request(message):
+    """Split "#<id> <command>" into (id, command); id is None if absent."""
+    if message.startswith("#"):
+        req_id, _, command = message[1:].partition(" ")
+        return req_id, command.strip()
+    return None, message.strip()
+
+
+class Job(object):
+    def __init__(self, req_id, command):
+        self.req_id = req_id
+        self.command = command
+        self.cancelled = threading.Event()
+        self.started = time.time()
+        self.future = None
+
+
+class CommandProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.server.transport = transport
+
+    def datagram_received(self, data, addr):
+        if udp_transfer.is_transfer_packet(data):
+            return  # Stray transfer packet, acknowledged on the transfer socket instead
+        try:
+            message = data.decode()
+        except UnicodeDecodeError:
+            return
+        print(f"Received message: {message} from {addr}")
+        self.server.dispatch(message)
+
+
+class PiServer(object):
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.transport = None
+        self.jobs = {}
+        self.finished = None
+        self._next_id = 0
+
+    def reply(self, req_id, text):
+        message = f"#{req_id} {text}" if req_id is not None else text
+        self.transport.sendto(message.encode(), (pc.NAO_IP, pc.PORT))
+        print(f"Sent message: {message}")
+
+    def dispatch(self, message):
+        req_id, command = parse_request(message)
+        loop = asyncio.get_running_loop()
+
+        if command == "status":
+            running = " ".join(f"{job.req_id}:{job.command}" for job in self.jobs.values())
+            self.reply(req_id, f"running {running}" if running else "idle")
+        elif command.startswith("cancel"):
+            target = command[len("cancel"):].strip()
+            job = self.jobs.get(target)
+            if job is None:
+                self.reply(req_id, f"unknown {target}")
+            else:
+                job.cancelled.set()
+                self.reply(req_id, f"cancelled {target}")
+        elif command == "end":
+            print("Ending process")
+            for job in self.jobs.values():
+                job.cancelled.set()
+            self.finished.set_result(None)
+        else:
+            if req_id is None:
+                self._next_id += 1
+                job_key = f"_{self._next_id}"
+            else:
+                job_key = req_id
+            job = Job(req_id, command)
+            self.jobs[job_key] = job
+            job.future = loop.create_task(self.run_job(job_key, job))
+
+    async def run_job(self, job_key, job):
+        loop = asyncio.get_running_loop()
+
+        def reply(text):
+            # Called from the worker thread; drop answers to cancelled jobs
+            if not job.cancelled.is_set():
+                loop.call_soon_threadsafe(self.reply, job.req_id, text)
+
+        # Audio ACKs come back to this socket, never to the command socket
+        transfer_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        transfer_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        transfer_sock.bind((pc.PI_IP, 0))
+        try:
+            await loop.run_in_executor(self.executor, pc.execute_command,
+                                       job.command, reply, job.cancelled, transfer_sock)
+            if job.cancelled.is_set() and job.req_id is not None:
+                self.reply(job.req_id, "cancelled")
+            print(f"Job {job_key} ({job.command}) took {time.time() - job.started:.2f}s")
+        except Exception as e:
+            print(f"Job {job_key} ({job.command}) failed: {e}")
+            if job.req_id is not None:
+                self.reply(job.req_id, "error")
+        finally:
+            transfer_sock.close()
+            self.jobs.pop(job_key, None)
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.finished = loop.create_future()
+        # Reuse the socket pi_communication already bound to PORT
+        pc.sock.setblocking(False)
+        transport, _ = await loop.create_datagram_endpoint(lambda: CommandProtocol(self), sock=pc.sock)
+        print("waiting for message")
+        try:
+            await self.finished
+        finally:
+            transport.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(warm_up=True, workers=2, background_monitor=True):
+    pc.cam_initializer()
+    if background_monitor:
+        pc.start_monitor()
+    if warm_up:
+        startup.warm_in_background(("whisper", stt_models.warm_up),
+                                   ("emotion model", pc.face_analysis.preload))
+    startup.report()
+    asyncio.run(PiServer(workers=workers).serve())
+    print(time.time() - pc.start)
+    pc.cam_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Picamera2 capture tuned for the vision loop.
+
+Each camera is configured with a small BGR "main" stream that DeepFace and
+OpenCV can use as-is and a YUV420 "lores" stream whose Y plane is already
+the grayscale image the face detector wants. Frames are copied straight out
+of the camera's DMA buffers into a pool of preallocated arrays, so the hot
+loop neither allocates full-size frames nor colour-converts them for
+detection.
+"""
+import sys
+import threading
+
+import numpy as np
+
+
+class CameraFrame(np.ndarray):
+    """BGR frame that also carries the matching grayscale image as `.gray`."""
+
+    def __array_finalize__(self, obj):
+        # Crops and other views must not inherit the full-frame gray image
+        self.gray = None
+
+
+# Pool reuse relies on CPython reference counts: a buffer is free when only
+# the pool's list entry refers to it. Views (crops, CameraFrame) hold their
+# base array, so a consumer that keeps any part of a frame makes the pool
+# grow rather than overwrite it. The baseline count is measured with a probe
+# in BufferPool.__init__ instead of hard-coded, since it differs between
+# CPython versions. Without sys.getrefcount every acquire() allocates.
+_REFCOUNTED = hasattr(sys, "getrefcount")
+
+
+def _refs(buf):
+    return sys.getrefcount(buf)
+
+
+class BufferPool(object):
+    """
+    Fixed-shape arrays handed out round-robin. A buffer is only reused once
+    nothing outside the pool (ring buffer, worker, crop view) still refers
+    to it; if all are busy the pool grows instead of overwriting one.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, count=8):
+        self.shape = shape
+        self.dtype = dtype
+        self._buffers = [np.empty(shape, dtype) for _ in range(count)]
+        self._lock = threading.Lock()
+        self._next = 0
+        probe = np.empty(1)
+        self._free_refs = _refs(probe) if _REFCOUNTED else None
+
+    def acquire(self):
+        if not _REFCOUNTED:
+            return np.empty(self.shape, self.dtype)
+        with self._lock:
+            n = len(self._buffers)
+            for i in range(n):
+                index = (self._next + i) % n
+                # The list entry stands in for the probe's local name
+                if _refs(self._buffers[index]) <= self._free_refs:
+                    self._next = index + 1
+                    return self._buffers[index]
+            buf = np.empty(self.shape, self.dtype)
+            self._buffers.append(buf)
+            return buf
+
+
+class PicamSource(object):
+    """
+    Drop-in for the Picamera2 object used by pi_communication: configure(),
+    capture_array() and close(). *main_size* should suit the emotion model,
+    *lores_size* the detector.
+    """
+
+    def __init__(self, index, main_size=(640, 480), lores_size=(320, 240), pool_size=8):
+        from picamera2 import Picamera2
+        self.camera = Picamera2(index)
+        self.main_size = main_size
+        self.lores_size = lores_size
+        w, h = main_size
+        lw, lh = lores_size
+        self._frames = BufferPool((h, w, 3), count=pool_size)
+        self._grays = BufferPool((lh, lw), count=pool_size)
+
+    def configure(self):
+        config = self.camera.create_video_configuration(
+            main={"size": self.main_size, "format": "RGB888"},  # BGR byte order, what OpenCV expects
+            lores={"size": self.lores_size, "format": "YUV420"},
+            buffer_count=4,
+        )
+        self.camera.configure(config)
+        self.camera.start()
+
+    def capture_array(self):
+        from picamera2 import MappedArray
+        w, h = self.main_size
+        lw, lh = self.lores_size
+        frame = self._frames.acquire()
+        gray = self._grays.acquire()
+        with self.camera.captured_request() as request:
+            with MappedArray(request, "main") as m:
+                np.copyto(frame, m.array[:h, :w, :3])
+            with MappedArray(request, "lores") as m:
+                # The first lh rows of a YUV420 buffer are the luma (Y) plane
+                np.copyto(gray, m.array[:lh, :lw])
+        out = frame.view(CameraFrame)
+        out.gray = gray
+        return out
+
+    def close(self):
+        self.camera.close()
@@ -0,0 +1,192 @@
+"""
+Swappable camera and audio sources.
+
+Every camera source has configure(), capture_array() and close(); every
+audio source has read(duration) -> (mono int16 array, sample rate) and
+listen(endpointer), which stops when the speaker does. Sources
+are picked with short spec strings so the same code runs on the Pi and on
+any dev box against recorded sessions:
+
+    camera:  picam:0 | video:clip.mp4 | images:frames/ | synthetic[:640x480]
+    audio:   mic | wav:test.wav | wav:received_files/
+"""
+import glob
+import os
+import time
+from itertools import cycle
+
+import numpy as np
+
+import audio_utils
+import endpointing
+
+
+def _throttle(last, fps):
+    """Sleep so consecutive captures are at most *fps* apart; returns now."""
+    if fps:
+        wait = last + 1.0 / fps - time.time()
+        if wait > 0:
+            time.sleep(wait)
+    return time.time()
+
+
+class VideoFileSource(object):
+    """Frames from a video file, looping at the end, paced at *fps* (0 = as fast as decoded)."""
+
+    def __init__(self, path, fps=15, loop=True):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self._cap = None
+        self._last = 0.0
+
+    def configure(self):
+        import cv2
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Cannot open video {self.path}")
+
+    def capture_array(self):
+        import cv2
+        if self._cap is None:
+            self.configure()
+        self._last = _throttle(self._last, self.fps)
+        ok, frame = self._cap.read()
+        if not ok and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        if not ok:
+            raise EOFError(f"End of video {self.path}")
+        return frame
+
+    def close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class ImageDirSource(object):
+    """Cycles through the images in a directory (sorted), decoded once up front."""
+
+    def __init__(self, directory, fps=15):
+        self.directory = directory
+        self.fps = fps
+        self._frames = None
+        self._last = 0.0
+
+    def configure(self):
+        import cv2
+        paths = sorted(p for ext in ("jpg", "jpeg", "png", "bmp")
+                       for p in glob.glob(os.path.join(self.directory, f"*.{ext}")))
+        if not paths:
+            raise RuntimeError(f"No images found in {self.directory}")
+        self._frames = cycle([cv2.imread(p) for p in paths])
+
+    def capture_array(self):
+        if self._frames is None:
+            self.configure()
+        self._last = _throttle(self._last, self.fps)
+        return next(self._frames)
+
+    def close(self):
+        self._frames = None
+
+
+class SyntheticSource(object):
+    """Noise background with a few drifting bright blobs; no files or hardware needed."""
+
+    def __init__(self, size=(640, 480), fps=15, blobs=3, seed=0):
+        self.size = size
+        self.fps = fps
+        self.blobs = blobs
+        self._rng = np.random.default_rng(seed)
+        self._t = 0
+        self._last = 0.0
+
+    def configure(self):
+        pass
+
+    def capture_array(self):
+        self._last = _throttle(self._last, self.fps)
+        w, h = self.size
+        frame = self._rng.integers(0, 40, size=(h, w, 3), dtype=np.uint8)
+        for i in range(self.blobs):
+            cx = int((w / (self.blobs + 1)) * (i + 1) + 20 * np.sin(self._t / 10 + i))
+            cy = h // 2
+            frame[max(0, cy - 30):cy + 30, max(0, cx - 25):cx + 25] = 200
+        self._t += 1
+        return frame
+
+    def close(self):
+        pass
+
+
+def make_camera(spec, fps=15, main_size=(640, 480), lores_size=(320, 240)):
+    kind, _, arg = spec.partition(":")
+    if kind == "picam":
+        from picam_source import PicamSource
+        return PicamSource(int(arg or 0), main_size=main_size, lores_size=lores_size)
+    if kind == "video":
+        return VideoFileSource(arg, fps=fps)
+    if kind == "images":
+        return ImageDirSource(arg, fps=fps)
+    if kind == "synthetic":
+        size = tuple(int(v) for v in arg.split("x")) if arg else main_size
+        return SyntheticSource(size=size, fps=fps)
+    raise ValueError(f"Unknown camera source: {spec}")
+
+
+class MicSource(object):
+    """Live microphone through sounddevice."""
+
+    def __init__(self, sample_rate=44100):
+        self.sample_rate = sample_rate
+
+    def read(self, duration):
+        import sounddevice as sd
+        audio = sd.rec(int(duration * self.sample_rate), samplerate=self.sample_rate, channels=1, dtype='int16')
+        sd.wait()  # Wait until recording is finished
+        return audio_utils.to_mono(audio), self.sample_rate
+
+    def listen(self, endpointer=None, on_frame=None):
+        return endpointing.record_utterance(self.sample_rate, endpointer, on_frame)
+
+
+class WavFileSource(object):
+    """
+    Replays WAV files (a single file or every .wav in a directory, in turn).
+    With *realtime* set, read() takes as long as the audio it returns, like a mic.
+    """
+
+    def __init__(self, path, realtime=False):
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, "*.wav")))
+        else:
+            paths = [path]
+        if not paths:
+            raise RuntimeError(f"No WAV files found at {path}")
+        self._clips = cycle([audio_utils.read_wav(p) for p in paths])
+        self.realtime = realtime
+
+    def read(self, duration=None):
+        """Next whole clip; *duration* only trims it, like a fixed-length recording."""
+        audio, rate = next(self._clips)
+        if duration:
+            audio = audio[:int(duration * rate)]
+        if self.realtime:
+            time.sleep(len(audio) / rate)
+        return audio, rate
+
+    def listen(self, endpointer=None, on_frame=None):
+        """Next clip, cut where the endpointer would have stopped a live recording."""
+        audio, rate = next(self._clips)
+        return endpointing.endpoint_clip(audio, rate, endpointer, realtime=self.realtime, on_frame=on_frame)
+
+
+def make_audio(spec):
+    kind, _, arg = spec.partition(":")
+    if kind == "mic":
+        return MicSource(int(arg) if arg else 44100)
+    if kind == "wav":
+        return WavFileSource(arg or "test.wav")
+    raise ValueError(f"Unknown audio source: {spec}")
@@ -0,0 +1,76 @@
+"""
+Lazy loading of heavy dependencies plus a startup profile.
+
+Modules such as deepface (TensorFlow), faster_whisper (CTranslate2), vosk
+and scipy are imported through load() on first use instead of at module
+import, and every import done this way is timed. report() prints where the
+cold-start time went; warm_in_background() does the expensive loading on a
+daemon thread so the Pi is answering messages while models load.
+
+Run `python startup.py` to time importing each dependency in isolation.
+"""
+import importlib
+import sys
+import threading
+import time
+
+_timings = {}
+process_start = time.time()
+
+HEAVY_MODULES = ("numpy", "scipy.signal", "cv2", "sounddevice", "vosk", "faster_whisper",
+                 "deepface.DeepFace", "requests", "picamera2", "llama_cpp")
+
+
+def load(name):
+    """Import *name* on first use, recording how long the import took."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    # importlib already serialises concurrent imports of the same module
+    start = time.time()
+    module = importlib.import_module(name)
+    _timings.setdefault(name, time.time() - start)
+    return module
+
+
+def record(label, seconds):
+    _timings[label] = seconds
+
+
+def report():
+    print("-" * 60)
+    print(f"Startup profile ({time.time() - process_start:.2f}s since start)")
+    for name, seconds in sorted(_timings.items(), key=lambda item: -item[1]):
+        print(f"{name:<28} {seconds:7.3f} s")
+    print("-" * 60)
+
+
+def warm_in_background(*steps):
+    """Run each (label, callable) step on one daemon thread, timing each."""
+    def run():
+        for label, step in steps:
+            start = time.time()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warm-up step {label} failed: {e}")
+            record(f"warm-up: {label}", time.time() - start)
+        report()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    # Each import measured in a fresh interpreter so shared deps are not hidden
+    import subprocess
+    code = "import time,importlib;t=time.time();importlib.import_module('{}');print(time.time()-t)"
+    for name in HEAVY_MODULES:
+        out = subprocess.run([sys.executable, "-c", code.format(name)], capture_output=True, text=True)
+        result = f"{float(out.stdout):7.3f} s" if out.returncode == 0 else "not installed"
+        print(f"{name:<28} {result}")
+
+
+if __name__ == "__main__":
+    main()
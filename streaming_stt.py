@@ -0,0 +1,333 @@
+"""
+Streaming speech-to-text on top of faster-whisper.
+
+Audio is appended to a preallocated float32 buffer. Every `step` seconds
+the uncommitted tail is re-decoded with word timestamps; words on which two
+consecutive hypotheses agree (local agreement) are committed and their
+audio is dropped from the buffer, so each pass only re-decodes the unstable
+tail instead of the whole utterance. When the VAD sees `silence` seconds of
+trailing silence after speech, the rest of the hypothesis is committed and
+the utterance is finalised.
+
+    stt = StreamingTranscriber(on_partial=print, on_final=print)
+    stt.start()
+    stt.feed(int16_chunk)          # from a mic callback, any chunk size
+    ...
+    text = stt.wait_final(timeout=8)
+"""
+import asyncio
+import re
+import threading
+import time
+
+import numpy as np
+
+import audio_utils
+import startup
+import stt_models
+
+RATE = audio_utils.STT_RATE
+
+
+class AudioRingBuffer(object):
+    """
+    Float32 sample buffer with a fixed allocation. Samples are appended at
+    the end and dropped from the front; the live region is always one
+    contiguous view, compacted to the start of the allocation when needed.
+    """
+
+    def __init__(self, max_seconds=30, rate=RATE):
+        self.capacity = int(max_seconds * rate)
+        self._data = np.zeros(self.capacity * 2, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+        self.dropped = 0  # Samples discarded from the front so far (for timing)
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, pcm16):
+        samples = np.asarray(pcm16).reshape(-1)
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        if len(self) + n > self.capacity:
+            self.discard(len(self) + n - self.capacity)
+        if self._end + n > len(self._data):
+            size = len(self)
+            self._data[:size] = self._data[self._start:self._end]
+            self._start, self._end = 0, size
+        # int16 -> [-1, 1) in place into the preallocated region
+        np.multiply(samples, 1.0 / 32768.0, out=self._data[self._end:self._end + n], casting="unsafe")
+        self._end += n
+
+    def discard(self, n):
+        n = min(n, len(self))
+        self._start += n
+        self.dropped += n
+
+    def view(self):
+        return self._data[self._start:self._end]
+
+    def clear(self):
+        self.discard(len(self))
+
+
+_WORD_CLEAN = re.compile(r"[^\w']+")
+
+
+def _norm(word):
+    return _WORD_CLEAN.sub("", word.lower())
+
+
+class StreamingTranscriber(object):
+
+    def __init__(self, model_size="tiny.en", step=0.5, max_seconds=20, silence=0.6,
+                 min_speech=0.2, beam_size=1, language="en", vad="silero",
+                 on_partial=None, on_final=None):
+        self.model_size = model_size
+        self.step = step
+        self.silence = silence
+        self.min_speech = min_speech
+        self.beam_size = beam_size
+        self.language = language
+        self.vad = vad
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.buffer = AudioRingBuffer(max_seconds)
+        self._lock = threading.Lock()
+        self._new_audio = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._finals = []
+        self._final_cond = threading.Condition()
+        self._listeners = []
+        self._resampler = None  # Carries filter state across fed chunks at another rate
+        self._reset_utterance()
+
+    def _reset_utterance(self):
+        self.committed = []      # Words fixed for the current utterance
+        self._previous = []      # Last hypothesis for the unstable tail
+        self._heard_speech = False
+
+    # -- input ------------------------------------------------------------
+    def feed(self, pcm16, sample_rate=RATE):
+        """Add mono int16 audio; resampled to 16 kHz if needed."""
+        if sample_rate != RATE:
+            if self._resampler is None or self._resampler.orig_rate != sample_rate:
+                self._resampler = audio_utils.StreamResampler(sample_rate)
+            pcm16 = self._resampler.process(pcm16)
+        with self._lock:
+            self.buffer.append(pcm16)
+        self._new_audio.set()
+
+    # -- control ----------------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="streaming-stt", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._new_audio.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self.buffer.clear()
+            self._reset_utterance()
+            self._resampler = None
+        with self._final_cond:
+            self._finals = []
+
+    def wait_final(self, timeout=None):
+        """Block until an utterance is finalised; returns its text or None."""
+        with self._final_cond:
+            if not self._final_cond.wait_for(lambda: self._finals, timeout):
+                return None
+            return self._finals.pop(0)
+
+    def abort(self):
+        """Wake a pending wait_final() with an empty result (the job was cancelled)."""
+        with self._final_cond:
+            self._finals.append("")
+            self._final_cond.notify_all()
+
+    def finish(self):
+        """Finalise whatever has been heard so far (e.g. the mic was closed)."""
+        with self._lock:
+            audio = self.buffer.view().copy()
+        self._decode(audio, force_final=True)
+
+    async def events(self):
+        """Async iterator of ("partial" | "final", text) tuples."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        listener = lambda kind, text: loop.call_soon_threadsafe(queue.put_nowait, (kind, text))
+        self._listeners.append(listener)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._listeners.remove(listener)
+
+    # -- decoding ---------------------------------------------------------
+    def _emit(self, kind, text):
+        callback = self.on_partial if kind == "partial" else self.on_final
+        if callback is not None:
+            callback(text)
+        for listener in list(self._listeners):
+            listener(kind, text)
+        if kind == "final":
+            with self._final_cond:
+                self._finals.append(text)
+                self._final_cond.notify_all()
+
+    def _run(self):
+        model = stt_models.get_whisper_model(self.model_size)
+        last = 0.0
+        while not self._stop.is_set():
+            self._new_audio.wait(timeout=self.step)
+            self._new_audio.clear()
+            wait = last + self.step - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            last = time.time()
+            with self._lock:
+                if len(self.buffer) < int(self.min_speech * RATE):
+                    continue
+                audio = self.buffer.view().copy()
+            self._decode(audio, model=model)
+
+    def _trailing_silence(self, audio):
+        """Seconds of silence at the end of *audio*, and whether it holds speech."""
+        if self.vad == "silero":
+            try:
+                vad = startup.load("faster_whisper.vad")
+                speech = vad.get_speech_timestamps(audio, vad.VadOptions(min_silence_duration_ms=int(self.silence * 1000)))
+                if not speech:
+                    return len(audio) / RATE, False
+                return (len(audio) - speech[-1]["end"]) / RATE, True
+            except (ImportError, AttributeError, TypeError):
+                self.vad = "energy"
+        # Energy gate on 30 ms frames
+        frame = int(0.03 * RATE)
+        n = len(audio) // frame
+        if n == 0:
+            return 0.0, False
+        rms = np.sqrt(np.mean(audio[:n * frame].reshape(n, frame) ** 2, axis=1))
+        voiced = np.nonzero(rms > 0.01)[0]
+        if len(voiced) == 0:
+            return len(audio) / RATE, False
+        return (n - 1 - voiced[-1]) * frame / RATE, True
+
+    def _decode(self, audio, model=None, force_final=False):
+        model = model or stt_models.get_whisper_model(self.model_size)
+        silence, has_speech = self._trailing_silence(audio)
+        if has_speech:
+            self._heard_speech = True
+        if not self._heard_speech and not force_final:
+            # Nothing said yet: keep only a little leading audio
+            with self._lock:
+                keep = int(0.5 * RATE)
+                if len(self.buffer) > keep:
+                    self.buffer.discard(len(self.buffer) - keep)
+            return
+
+        prompt = " ".join(self.committed[-30:]) or None
+        segments, _ = model.transcribe(audio, language=self.language, beam_size=self.beam_size,
+                                       word_timestamps=True, condition_on_previous_text=False,
+                                       initial_prompt=prompt, vad_filter=False)
+        words = [(w.word.strip(), w.end) for seg in segments for w in (seg.words or []) if w.word.strip()]
+
+        final = force_final or silence >= self.silence
+        if final:
+            stable = len(words)
+        else:
+            # Local agreement: commit the prefix two hypotheses agree on
+            stable = 0
+            for (word, _), previous in zip(words, self._previous):
+                if _norm(word) != _norm(previous):
+                    break
+                stable += 1
+        self.committed.extend(word for word, _ in words[:stable])
+        self._previous = [word for word, _ in words[stable:]]
+        if stable and not final:
+            with self._lock:
+                self.buffer.discard(int(words[stable - 1][1] * RATE))
+
+        if final:
+            text = " ".join(self.committed).strip()
+            with self._lock:
+                self.buffer.discard(len(audio))
+                self._reset_utterance()
+            if text:
+                self._emit("final", text)
+        else:
+            self._emit("partial", " ".join(self.committed + self._previous))
+
+
+def listen_once(transcriber, max_seconds=8, sample_rate=44100, block=0.1):
+    """Stream the mic into *transcriber* until one utterance is final."""
+    sd = startup.load("sounddevice")
+    transcriber.reset()
+    transcriber.start()
+    resampler = audio_utils.StreamResampler(sample_rate)
+
+    def callback(indata, frames, time_info, status):
+        transcriber.feed(resampler.process(indata[:, 0]))
+
+    try:
+        with sd.InputStream(samplerate=sample_rate, channels=1, dtype='int16',
+                            blocksize=int(block * sample_rate), callback=callback):
+            text = transcriber.wait_final(timeout=max_seconds)
+    finally:
+        transcriber.stop()
+    if text is None:
+        transcriber.finish()
+        text = transcriber.wait_final(timeout=0) or ""
+    return text
+
+
+def transcribe_clip(transcriber, audio, sample_rate=RATE, chunk=0.1, realtime=False):
+    """
+    Feed a recorded clip through *transcriber* in mic-sized chunks (offline
+    runs). With *realtime* the clip arrives at speaking pace and partials are
+    emitted along the way, exactly as from the mic.
+    """
+    transcriber.reset()
+    if realtime:
+        transcriber.start()
+    step = int(chunk * sample_rate)
+    text = None
+    try:
+        for i in range(0, len(audio), step):
+            transcriber.feed(audio[i:i + step], sample_rate)
+            if realtime:
+                time.sleep(chunk)
+        if realtime:
+            text = transcriber.wait_final(timeout=transcriber.silence + 2 * transcriber.step)
+    finally:
+        transcriber.stop()
+    if text is not None:
+        return text
+    transcriber.finish()
+    return transcriber.wait_final(timeout=0) or ""
+
+
+_transcribers = {}
+_transcribers_lock = threading.Lock()
+
+
+def get_transcriber(model_size="tiny.en"):
+    """Process-wide transcriber per model size, so its buffer is allocated once."""
+    with _transcribers_lock:
+        transcriber = _transcribers.get(model_size)
+        if transcriber is None:
+            transcriber = _transcribers[model_size] = StreamingTranscriber(model_size)
+    return transcriber
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+import startup
+
+# Process-wide cache of loaded STT models, keyed by backend and settings.
+# Loading a model is the slowest part of a short transcription, so every
+# caller (LLM_Joke, the Pi command loop, benchmarks) shares these instances.
+_models = {}
+_lock = threading.Lock()
+
+
+def _get(key, loader):
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.time()
+            model = loader()
+            _models[key] = model
+            print(f"Loaded {key[0]} model {key[1]} in {time.time() - start:.2f}s")
+    return model
+
+
+def get_whisper_model(model_size="tiny.en", device="cpu", compute_type="int8", cpu_threads=0):
+    """Return a shared faster-whisper model, loading it on first use."""
+    key = ("whisper", model_size, device, compute_type, cpu_threads)
+    # faster_whisper (CTranslate2) is only imported when a model is first needed
+    return _get(key, lambda: startup.load("faster_whisper").WhisperModel(
+        model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads))
+
+
+def get_vosk_model(model_path="vosk-model"):
+    """Return a shared Vosk model, loading it on first use."""
+    key = ("vosk", model_path)
+    return _get(key, lambda: startup.load("vosk").Model(model_path))
+
+
+def loaded_models():
+    return list(_models.keys())
+
+
+def warm_up(backends=("whisper",), vosk_model_path="vosk-model"):
+    """
+    Load the requested backends and run one short silent transcription
+    through each, so the first real request does not pay for lazy
+    initialisation inside the decoder.
+    """
+    silence = np.zeros(16000, dtype=np.float32)
+    if "whisper" in backends:
+        start = time.time()
+        segments, _ = get_whisper_model().transcribe(silence, beam_size=1)
+        list(segments)  # transcribe() is lazy, consume it to actually decode
+        print(f"Whisper warm-up: {time.time() - start:.2f}s")
+    if "vosk" in backends:
+        start = time.time()
+        recognizer = startup.load("vosk").KaldiRecognizer(get_vosk_model(vosk_model_path), 16000)
+        recognizer.AcceptWaveform(np.zeros(16000, dtype=np.int16).tobytes())
+        recognizer.FinalResult()
+        print(f"Vosk warm-up: {time.time() - start:.2f}s")
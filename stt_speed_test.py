@@ -1,22 +1,45 @@
+"""
+STT benchmark harness.
+
+Every engine configuration runs in its own fresh process so that cold-load
+time and peak RSS are not skewed by whatever ran before it. Inside that
+process the model is loaded (cold load), the first transcription is timed
+on its own, then the corpus is transcribed `--warmup` times untimed and
+`--iterations` times measured. Reported per configuration:
+
+    load / first-call time, warm wall time (mean, median, stdev, p95),
+    real-time factor, CPU time, peak RSS, WER against reference transcripts
+
+A corpus is a directory of WAV files; a reference transcript for clip.wav is
+read from clip.txt next to it (clips without one are timed but not scored).
+
+    python stt_speed_test.py --corpus test.wav
+    python stt_speed_test.py --corpus clips/ --engines faster-whisper,vosk \
+        --whisper-sizes tiny.en,base.en --compute-types int8,float32 \
+        --iterations 5 --json results.json --csv results.csv
+"""
 import argparse
+import csv
+import glob
+import json
 import os, warnings, logging
+import re
+import resource
+import statistics
 import subprocess
 import sys
 import tempfile
 import time
-import wave
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
-from typing import List, Tuple
-
-import speech_recognition as sr
-try:
-    from vosk import SetLogLevel  # noqa: E402
-    SetLogLevel(-1)               # -1 = completely silent
-except ImportError:
-    pass
-from vosk import Model, KaldiRecognizer
-import whisper
-from faster_whisper import WhisperModel
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import audio_utils
+import startup
+import vosk_grammar
 
 warnings.filterwarnings("ignore")
 os.environ["PYTHONWARNINGS"] = "ignore"
@@ -46,6 +69,7 @@ def convert_to_wav16k_mono(src: Path) -> Path:
 
 def record_mic(duration: int) -> Path:
     """Record mic for *duration* seconds to a 16-kHz mono WAV, return path."""
+    sr = startup.load("speech_recognition")
     dest = Path(__file__).resolve().parent / "test.wav"   # always ./test.wav
     r = sr.Recognizer()
     with sr.Microphone(sample_rate=16000) as source:
@@ -59,52 +83,133 @@ def record_mic(duration: int) -> Path:
     print("Recording saved.\n")
     return dest
 
+def load_audio(wav) -> np.ndarray:
+    """Mono 16 kHz int16 samples of *wav*."""
+    audio, rate = audio_utils.read_wav(wav)
+    return audio_utils.resample(audio, rate)
+
 # ----------------------------------------------------------------------
-def run_pocketsphinx(wav: Path) -> Tuple[float, str]:
-    rec = sr.Recognizer()
-    with wave.open(str(wav), "rb") as wf:
-        audio = sr.AudioData(wf.readframes(wf.getnframes()),
-                             wf.getframerate(),
-                             wf.getsampwidth())
-    t0 = time.perf_counter()
-    text = rec.recognize_sphinx(audio)
-    return time.perf_counter() - t0, text
+# Engines: load() builds the model (timed as cold load), transcribe() takes
+# 16 kHz int16 samples already in memory so file I/O is never on the clock.
+
+class PocketSphinxEngine(object):
+    name = "PocketSphinx"
+
+    def __init__(self, **_):
+        self.label = self.name
+
+    def load(self):
+        self._rec = startup.load("speech_recognition").Recognizer()
+
+    def transcribe(self, audio):
+        sr = startup.load("speech_recognition")
+        data = sr.AudioData(np.ascontiguousarray(audio, dtype=np.int16).tobytes(), audio_utils.STT_RATE, 2)
+        return self._rec.recognize_sphinx(data)
+
+
+class VoskEngine(object):
+    name = "Vosk"
+
+    def __init__(self, model_path=None, grammar=None, **_):
+        # Expect a model in the working dir or VOSK_MODEL env var
+        self.model_path = model_path or os.getenv("VOSK_MODEL", "vosk-model-small-en-us-0.15")
+        # Optional phrase-list grammar: a vosk_grammar vocabulary name or file path(s)
+        self.grammar = grammar
+        self.label = f"{self.name} {os.path.basename(self.model_path.rstrip('/'))}"
+        if grammar:
+            self.label += f" grammar={grammar}"
+
+    def load(self):
+        if not os.path.isdir(self.model_path):
+            raise RuntimeError(f"Vosk model not found at {self.model_path}")
+        vosk = startup.load("vosk")
+        vosk.SetLogLevel(-1)  # -1 = completely silent
+        self._model = vosk.Model(self.model_path)
+        self._grammar = None
+        if self.grammar:
+            self._grammar = json.dumps(vosk_grammar.load_vocabulary(self.grammar) + [vosk_grammar.UNKNOWN])
+
+    def transcribe(self, audio):
+        vosk = startup.load("vosk")
+        if self._grammar:
+            rec = vosk.KaldiRecognizer(self._model, audio_utils.STT_RATE, self._grammar)
+        else:
+            rec = vosk.KaldiRecognizer(self._model, audio_utils.STT_RATE)
+        pcm = memoryview(np.ascontiguousarray(audio, dtype=np.int16)).cast("B")
+        step = 4000 * 2  # 4000 int16 frames at a time
+        for i in range(0, len(pcm), step):
+            rec.AcceptWaveform(bytes(pcm[i:i + step]))
+        return json.loads(rec.FinalResult()).get("text", "")
+
+
+class WhisperEngine(object):
+    name = "Whisper"
+
+    def __init__(self, model_size="tiny.en", **_):
+        self.model_size = model_size
+        self.label = f"{self.name} {model_size}"
+
+    def load(self):
+        self._model = startup.load("whisper").load_model(self.model_size)
+
+    def transcribe(self, audio):
+        out = self._model.transcribe(audio_utils.int16_to_float32(audio), fp16=False, language="en")
+        return out["text"].strip()
+
+
+class FasterWhisperEngine(object):
+    name = "Faster-Whisper"
+
+    def __init__(self, model_size="tiny.en", compute_type="int8", cpu_threads=0, beam_size=1, **_):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self.label = f"{self.name} {model_size} {compute_type}"
+
+    def load(self):
+        self._model = startup.load("faster_whisper").WhisperModel(
+            self.model_size, device="cpu", compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+
+    def transcribe(self, audio):
+        segments, _ = self._model.transcribe(audio_utils.int16_to_float32(audio), beam_size=self.beam_size)
+        return " ".join(seg.text.strip() for seg in segments)
+
+
+ENGINES = {
+    "vosk":           VoskEngine,
+    "pocketsphinx":   PocketSphinxEngine,
+    "whisper":        WhisperEngine,
+    "faster-whisper": FasterWhisperEngine,
+}
 
 
-def run_vosk(wav: Path) -> Tuple[float, str]:
-    # Expect a model in the working dir or VOSK_MODEL env var
-    model_path = os.getenv("VOSK_MODEL", "vosk-model-small-en-us-0.15")
-    if not os.path.isdir(model_path):
-        raise RuntimeError(f"Vosk model not found at {model_path}")
-    model = Model(model_path)
-    rec = KaldiRecognizer(model, 16000)
-    wf = wave.open(str(wav), "rb")
+def _run_once(engine_cls, wav, **options) -> Tuple[float, str]:
+    # Model load stays outside the timer for every engine
+    engine = engine_cls(**options)
+    engine.load()
+    audio = load_audio(wav)
     t0 = time.perf_counter()
-    while True:
-        data = wf.readframes(4000)
-        if not data:
-            break
-        rec.AcceptWaveform(data)
-    text = rec.FinalResult()
+    text = engine.transcribe(audio)
     return time.perf_counter() - t0, text
 
 
+def run_pocketsphinx(wav: Path) -> Tuple[float, str]:
+    return _run_once(PocketSphinxEngine, wav)
+
+
+def run_vosk(wav: Path, grammar=None) -> Tuple[float, str]:
+    return _run_once(VoskEngine, wav, grammar=grammar)
+
+
 def run_whisper(wav: Path) -> Tuple[float, str]:
-    model = whisper.load_model("tiny.en")      # load once, outside timer
-    t0 = time.perf_counter()
-    out = model.transcribe(str(wav), fp16=False, language="en")
-    return time.perf_counter() - t0, out["text"].strip()
+    return _run_once(WhisperEngine, wav)
 
 
 def run_faster_whisper(wav: Path) -> Tuple[float, str]:
-    model = WhisperModel("tiny.en", device="cpu", compute_type="int8")
-    t0 = time.perf_counter()
-    segments, _ = model.transcribe(str(wav), beam_size=1)
-    text = " ".join(seg.text.strip() for seg in segments)
-    return time.perf_counter() - t0, text
+    return _run_once(FasterWhisperEngine, wav)
 
 
-# ----------------------------------------------------------------------
 ENGINE_FUNCS = {
     "Vosk":           run_vosk,
     "PocketSphinx":   run_pocketsphinx,
@@ -113,31 +218,169 @@ ENGINE_FUNCS = {
 }
 
 # ----------------------------------------------------------------------
-def main(record: bool) -> None:
-    if record:
-        wav = record_mic(10)
-        #wav = convert_to_wav16k_mono("test.wav")
+def normalize_words(text: str) -> List[str]:
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """(substitutions + deletions + insertions, reference word count)."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+def load_corpus(path: str) -> List[Dict]:
+    """Clips under *path* (a WAV file, directory or glob) with optional references."""
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, "*.wav")))
     else:
-        wav = "test.wav"
+        paths = sorted(glob.glob(path))
+    if not paths:
+        sys.exit(f"ERROR: no WAV files found at {path}")
+    corpus = []
+    for wav in paths:
+        audio = load_audio(wav)
+        ref_path = os.path.splitext(wav)[0] + ".txt"
+        reference = Path(ref_path).read_text().strip() if os.path.exists(ref_path) else None
+        corpus.append({"path": wav, "audio": audio, "seconds": len(audio) / audio_utils.STT_RATE,
+                       "reference": reference})
+    return corpus
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
 
-    print(f"Benchmarking on: {wav}")
-    print("-" * 60)
 
-    results: List[Tuple[str, float, str]] = []
+def benchmark(engine_name: str, options: Dict, corpus_path: str, warmup: int, iterations: int) -> Dict:
+    """Runs inside a fresh worker process; returns one result row."""
+    corpus = load_corpus(corpus_path)
+    audio_seconds = sum(clip["seconds"] for clip in corpus)
+    engine = ENGINES[engine_name](**options)
+    result = {"engine": engine_name, "label": engine.label, **options,
+              "clips": len(corpus), "audio_s": round(audio_seconds, 3)}
+
+    start = time.perf_counter()
+    engine.load()
+    result["load_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.transcribe(corpus[0]["audio"])
+    result["first_call_s"] = time.perf_counter() - start
+
+    for _ in range(warmup):
+        for clip in corpus:
+            engine.transcribe(clip["audio"])
+
+    walls, cpus, texts = [], [], []
+    for _ in range(iterations):
+        wall, cpu = time.perf_counter(), time.process_time()
+        texts = [engine.transcribe(clip["audio"]) for clip in corpus]
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+
+    errors = words = 0
+    for clip, text in zip(corpus, texts):
+        if clip["reference"] is not None:
+            e, n = word_errors(clip["reference"], text)
+            errors += e
+            words += n
+    result.update({
+        "warm_mean_s": statistics.mean(walls),
+        "warm_median_s": statistics.median(walls),
+        "warm_stdev_s": statistics.stdev(walls) if len(walls) > 1 else 0.0,
+        "warm_p95_s": sorted(walls)[min(len(walls) - 1, int(len(walls) * 0.95))],
+        "rtf": statistics.median(walls) / audio_seconds,
+        "cpu_s": statistics.mean(cpus),
+        "peak_rss_mb": _peak_rss_mb(),
+        "wer": errors / words if words else None,
+        "sample_text": texts[0] if texts else "",
+    })
+    return result
+
+
+def configurations(args) -> List[Tuple[str, Dict]]:
+    configs = []
+    for engine in args.engines.split(","):
+        if engine == "faster-whisper":
+            for size in args.whisper_sizes.split(","):
+                for compute_type in args.compute_types.split(","):
+                    configs.append((engine, {"model_size": size, "compute_type": compute_type,
+                                             "cpu_threads": args.cpu_threads, "beam_size": args.beam_size}))
+        elif engine == "whisper":
+            configs.extend((engine, {"model_size": size}) for size in args.whisper_sizes.split(","))
+        elif engine == "vosk":
+            configs.extend((engine, {"model_path": path, "grammar": args.vosk_grammar})
+                           for path in args.vosk_models.split(","))
+        elif engine in ENGINES:
+            configs.append((engine, {}))
+        else:
+            sys.exit(f"ERROR: unknown engine {engine} (choose from {', '.join(ENGINES)})")
+    return configs
+
+
+def write_outputs(results: List[Dict], json_path=None, csv_path=None) -> None:
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+    if csv_path:
+        fields = sorted({key for row in results for key in row})
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'engine':<34} {'load':>7} {'first':>7} {'warm p50':>9} {'stdev':>7} {'RTF':>6} "
+          f"{'CPU':>7} {'RSS MB':>7} {'WER':>6}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['label']:<34} error: {row['error']}")
+            continue
+        wer = f"{row['wer']:.1%}" if row["wer"] is not None else "n/a"
+        print(f"{row['label']:<34} {row['load_s']:7.2f} {row['first_call_s']:7.3f} {row['warm_median_s']:9.3f} "
+              f"{row['warm_stdev_s']:7.3f} {row['rtf']:6.3f} {row['cpu_s']:7.2f} {row['peak_rss_mb']:7.0f} {wer:>6}")
+
+
+# ----------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark STT engines over a corpus of recordings")
+    parser.add_argument("--corpus", default="test.wav", help="WAV file, directory or glob (references in .txt)")
+    parser.add_argument("--record", type=int, default=0, help="Record N seconds to test.wav first")
+    parser.add_argument("--engines", default="faster-whisper,vosk", help=f"Comma-separated: {','.join(ENGINES)}")
+    parser.add_argument("--whisper-sizes", default="tiny.en")
+    parser.add_argument("--compute-types", default="int8")
+    parser.add_argument("--cpu-threads", type=int, default=0)
+    parser.add_argument("--beam-size", type=int, default=1)
+    parser.add_argument("--vosk-models", default=os.getenv("VOSK_MODEL", "vosk-model-small-en-us-0.15"))
+    parser.add_argument("--vosk-grammar", help="Restrict Vosk to a phrase list (location, profession or a vocab file)")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--csv", help="Write results to this CSV file")
+    args = parser.parse_args()
+
+    corpus_path = str(record_mic(args.record)) if args.record else args.corpus
+    print(f"Benchmarking on: {corpus_path}")
+    print("-" * 60)
 
-    for name, func in ENGINE_FUNCS.items():
-        try:
-            elapsed, text = func(wav)
-            results.append((name, elapsed, text))
-        except ModuleNotFoundError:
-            print(f"{name:<16} |  n/a   | (module not installed)")
-        except Exception as e:
-            print(f"{name:<16} |  n/a   | error: {e}")
+    results = []
+    for engine_name, options in configurations(args):
+        # A fresh process per configuration keeps cold load and peak RSS honest
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            future = pool.submit(benchmark, engine_name, options, corpus_path, args.warmup, args.iterations)
+            try:
+                results.append(future.result())
+            except Exception as e:
+                label = ENGINES[engine_name](**options).label
+                results.append({"engine": engine_name, "label": label, **options, "error": str(e)})
 
-    # Pretty-print successful results
-    for name, elapsed, text in results:
-        print(f"{name:<16} | {elapsed:7.3f} s | {text}")
+    print_table(results)
+    write_outputs(results, args.json, args.csv)
 
 
 if __name__ == "__main__":
-    main(record=False)
\ No newline at end of file
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import io
+import os
+import queue
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from pathlib import Path
+
+import joke_templates
+
+DEFAULT_VOICE = os.path.expanduser("~/comedy-robot-strategies/piper/joey7999.onnx")
+DEFAULT_CACHE_DIR = "tts_cache"
+
+
+def pcm_to_wav(pcm, sample_rate, channels=1):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buf.getvalue()
+
+
+class PiperTTS(object):
+    """
+    Piper voice that stays loaded for the life of the process.
+
+    Uses the piper Python package in-process when it is installed, otherwise
+    keeps one `piper --output_dir` worker running and feeds it one sentence
+    per line. Rendered audio is cached in memory and on disk by exact text.
+    """
+
+    def __init__(self, model_path=DEFAULT_VOICE, cache_dir=DEFAULT_CACHE_DIR, memory_items=64):
+        self.model_path = model_path
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()         # One render at a time
+        self._memory_lock = threading.Lock()  # Guards _memory, shared by every caller thread
+        self._voice = None
+        self._worker = None
+        self._worker_dir = None
+        self.voice_id = Path(model_path).stem
+
+    # -- backends ---------------------------------------------------------
+    def _load(self):
+        if self._voice is not None or self._worker is not None:
+            return
+        try:
+            from piper.voice import PiperVoice
+            start = time.time()
+            self._voice = PiperVoice.load(self.model_path)
+            print(f"Loaded Piper voice in-process in {time.time() - start:.2f}s")
+        except ImportError:
+            self._worker_dir = tempfile.mkdtemp(prefix="piper_")
+            self._worker = subprocess.Popen(
+                ["piper", "--model", self.model_path, "--output_dir", self._worker_dir],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1,
+            )
+            print("Started long-lived piper worker")
+
+    @property
+    def sample_rate(self):
+        self._load()
+        if self._voice is not None:
+            return self._voice.config.sample_rate
+        return 22050
+
+    def _render(self, text):
+        """Synthesize *text* and return the WAV bytes."""
+        self._load()
+        if self._voice is not None:
+            pcm = b"".join(self._voice.synthesize_stream_raw(text))
+            return pcm_to_wav(pcm, self._voice.config.sample_rate)
+        # The worker writes one WAV per input line and prints its path
+        self._worker.stdin.write(" ".join(text.split()) + "\n")
+        self._worker.stdin.flush()
+        path = self._worker.stdout.readline().strip()
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        return data
+
+    # -- cache ------------------------------------------------------------
+    def _key(self, text):
+        return hashlib.sha1(f"{self.voice_id}\n{text}".encode()).hexdigest()
+
+    def cached(self, text):
+        key = self._key(text)
+        with self._memory_lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        path = self.cache_dir / f"{key}.wav"
+        if path.exists():
+            data = path.read_bytes()
+            self._remember(key, data)
+            return data
+        return None
+
+    def _remember(self, key, data):
+        with self._memory_lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def synthesize(self, text):
+        """WAV bytes for *text*, rendering only on a cache miss."""
+        data = self.cached(text)
+        if data is not None:
+            return data
+        with self._lock:
+            data = self._render(text)
+        key = self._key(text)
+        (self.cache_dir / f"{key}.wav").write_bytes(data)
+        self._remember(key, data)
+        return data
+
+    def stream(self, text, clauses=False):
+        """
+        Yield WAV bytes one sentence (or clause) at a time. The next segment
+        is rendered on a background thread while the caller handles the
+        current one, so the first audio is ready after the first segment.
+        """
+        segments = split_segments(text, clauses=clauses)
+        ready = queue.Queue(maxsize=2)
+        stopped = threading.Event()  # Set when the caller stops iterating early
+
+        def offer(item):
+            while not stopped.is_set():
+                try:
+                    ready.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def producer():
+            try:
+                for segment in segments:
+                    if stopped.is_set() or not offer(self.synthesize(segment)):
+                        return
+            except Exception as e:
+                offer(e)
+            offer(None)
+
+        threading.Thread(target=producer, daemon=True).start()
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    def synthesize_to_file(self, text, filename):
+        with open(filename, "wb") as f:
+            f.write(self.synthesize(text))
+        return filename
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.stdin.close()
+            self._worker.wait()
+            self._worker = None
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+_CLAUSE_RE = re.compile(r"(?<=[.!?…,;:])\s+")
+
+
+def split_segments(text, clauses=False):
+    """Split *text* into sentences, or into clauses when *clauses* is set."""
+    pattern = _CLAUSE_RE if clauses else _SENTENCE_RE
+    return [part.strip() for part in pattern.split(text) if part.strip()]
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide shared voice."""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = PiperTTS()
+    return _default_engine
+
+
+def _read_list(path, default):
+    if not path:
+        return default
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def prerender(locations=None, professions=None, model_path=DEFAULT_VOICE, cache_dir=DEFAULT_CACHE_DIR):
+    """Render every joke sentence for the given inputs into the disk cache."""
+    engine = PiperTTS(model_path=model_path, cache_dir=cache_dir, memory_items=0)
+    sentences = []
+    for joke in joke_templates.all_sentences(locations or joke_templates.COMMON_LOCATIONS,
+                                             professions or joke_templates.COMMON_PROFESSIONS):
+        # Whole joke for file mode, plus each sentence for streaming mode
+        sentences.append(joke)
+        segments = split_segments(joke)
+        if len(segments) > 1:
+            sentences.extend(segments)
+    sentences = list(dict.fromkeys(sentences))
+    start = time.time()
+    rendered = 0
+    for sentence in sentences:
+        if engine.cached(sentence) is None:
+            engine.synthesize(sentence)
+            rendered += 1
+    engine.close()
+    print(f"{len(sentences)} sentences, {rendered} newly rendered in {time.time() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the joke bank into the TTS cache")
+    parser.add_argument("--locations", help="Text file with one location per line")
+    parser.add_argument("--professions", help="Text file with one profession per line")
+    parser.add_argument("--model", default=DEFAULT_VOICE, help="Piper .onnx voice")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    prerender(_read_list(args.locations, None), _read_list(args.professions, None),
+              model_path=args.model, cache_dir=args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Reliable, windowed file transfer on top of a plain UDP socket.
+
+Every DATA packet carries the transfer ID, its sequence number, the total
+length of the transfer and a CRC32, so the receiver can tell transfers apart,
+knows when it has everything and drops corrupted packets. The sender keeps up
+to `window` packets in flight. The receiver periodically reports the first
+sequence number it is still missing plus the gaps above it (selective NACK),
+and the sender retransmits only those. Once every byte has arrived the
+receiver answers with DONE, which is the final ACK for the sender.
+
+Transfer packets start with a magic prefix that is not valid UTF-8, so the
+same socket keeps carrying the plain-text command messages.
+"""
+import os
+import select
+import struct
+import time
+import zlib
+
+MAGIC = b"\xa5\x5a"
+DATA, STATUS, DONE, POLL = 1, 2, 3, 4
+
+# magic, type, transfer id, sequence number, total length, payload size, crc32
+DATA_HEADER = struct.Struct("!2sBIIIHI")
+# magic, type, transfer id, first missing sequence number, number of NACKs
+CTRL_HEADER = struct.Struct("!2sBIIH")
+
+# The CRC covers the whole packet except the CRC field itself
+CRC_OFFSET = DATA_HEADER.size - 4
+
+# Largest UDP payload that fits a 1500-byte Ethernet/Wi-Fi MTU without IP
+# fragmentation (1500 - 20 IP - 8 UDP). Links with jumbo frames can pass a
+# larger payload_size to send_reliable().
+MAX_DATAGRAM = 1472
+DEFAULT_PAYLOAD = MAX_DATAGRAM - DATA_HEADER.size
+DEFAULT_WINDOW = 64
+MAX_NACKS = 256
+RECV_BUFFER = 65536
+MAX_TRANSFER = 16 << 20   # Largest total_len a receiver will allocate for (a joke WAV is a few hundred KB)
+INCOMING_TIMEOUT = 15.0   # Seconds without a packet before a partial transfer is dropped
+
+
+def is_transfer_packet(data):
+    return data[:2] == MAGIC
+
+
+def new_transfer_id():
+    return struct.unpack("!I", os.urandom(4))[0]
+
+
+def _crc(packet, size):
+    return zlib.crc32(packet[DATA_HEADER.size:size], zlib.crc32(packet[:CRC_OFFSET]))
+
+
+def build_data_packet(transfer_id, seq, total_len, payload_size, payload):
+    packet = bytearray(DATA_HEADER.size + len(payload))
+    DATA_HEADER.pack_into(packet, 0, MAGIC, DATA, transfer_id, seq, total_len, payload_size, 0)
+    packet[DATA_HEADER.size:] = payload
+    struct.pack_into("!I", packet, CRC_OFFSET, _crc(packet, len(packet)))
+    return bytes(packet)
+
+
+def build_ctrl_packet(kind, transfer_id, cum_ack=0, missing=()):
+    missing = list(missing)[:MAX_NACKS]
+    return CTRL_HEADER.pack(MAGIC, kind, transfer_id, cum_ack, len(missing)) + \
+        struct.pack(f"!{len(missing)}I", *missing)
+
+
+def parse_ctrl_packet(data):
+    """Return (kind, transfer_id, cum_ack, missing) or None if malformed."""
+    if len(data) < CTRL_HEADER.size:
+        return None
+    _, kind, transfer_id, cum_ack, count = CTRL_HEADER.unpack_from(data)
+    if kind not in (STATUS, DONE, POLL) or len(data) < CTRL_HEADER.size + 4 * count:
+        return None
+    missing = struct.unpack_from(f"!{count}I", data, CTRL_HEADER.size)
+    return kind, transfer_id, cum_ack, missing
+
+
+def packet_count(total_len, payload_size):
+    return max(1, -(-total_len // payload_size))
+
+
+def recv_into(sock, buf):
+    """recvfrom_into a preallocated buffer; returns (memoryview, addr)."""
+    nbytes, addr = sock.recvfrom_into(buf)
+    return memoryview(buf)[:nbytes], addr
+
+
+def send_reliable(sock, data, addr, payload_size=DEFAULT_PAYLOAD, window=DEFAULT_WINDOW,
+                  rto=0.2, max_retries=25, on_other=None):
+    """
+    Send *data* to *addr* and block until the receiver has confirmed it.
+    Datagrams that are not part of this transfer (e.g. commands arriving
+    meanwhile) are passed to *on_other(data, addr)* instead of being lost.
+    Raises TimeoutError if the receiver stops answering.
+    """
+    transfer_id = new_transfer_id()
+    total_len = len(data)
+    count = packet_count(total_len, payload_size)
+    view = memoryview(data).cast("B")
+
+    # One packet buffer reused for every send: the header is packed and the
+    # payload copied into it in place, so no per-chunk objects are created.
+    out_buf = bytearray(DATA_HEADER.size + payload_size)
+    out = memoryview(out_buf)
+    in_buf = bytearray(RECV_BUFFER)
+
+    def send(seq):
+        offset = seq * payload_size
+        size = DATA_HEADER.size + min(payload_size, total_len - offset)
+        DATA_HEADER.pack_into(out_buf, 0, MAGIC, DATA, transfer_id, seq, total_len, payload_size, 0)
+        out[DATA_HEADER.size:size] = view[offset:offset + size - DATA_HEADER.size]
+        struct.pack_into("!I", out_buf, CRC_OFFSET, _crc(out, size))
+        sock.sendto(out[:size], addr)
+
+    base = 0
+    next_seq = 0
+    retries = 0
+    retransmits = 0
+    resent_at = {}
+    start = time.time()
+    while True:
+        # Fill the window
+        while next_seq < count and next_seq < base + window:
+            send(next_seq)
+            next_seq += 1
+
+        ready, _, _ = select.select([sock], [], [], rto)
+        if not ready:
+            retries += 1
+            if retries > max_retries:
+                raise TimeoutError(f"Transfer {transfer_id:08x} got no answer from {addr}")
+            # Everything in flight (or every report) may have been lost
+            sock.sendto(build_ctrl_packet(POLL, transfer_id), addr)
+            now = time.time()
+            for seq in range(base, next_seq):
+                if now - resent_at.get(seq, 0) > rto:
+                    send(seq)
+                    resent_at[seq] = now
+                    retransmits += 1
+            continue
+
+        reply, src = recv_into(sock, in_buf)
+        ctrl = parse_ctrl_packet(reply) if is_transfer_packet(reply) else None
+        if ctrl is None or ctrl[1] != transfer_id:
+            if on_other is not None and not is_transfer_packet(reply):
+                on_other(bytes(reply), src)
+            continue
+
+        kind, _, cum_ack, missing = ctrl
+        retries = 0
+        if kind == DONE:
+            elapsed = time.time() - start
+            print(f"Transfer {transfer_id:08x}: {total_len} bytes in {count} packets, "
+                  f"{retransmits} retransmitted, {elapsed:.3f}s")
+            return transfer_id
+        if kind == STATUS:
+            base = max(base, min(cum_ack, count))
+            now = time.time()
+            for seq in missing:
+                # Several reports can name the same gap before the resend lands
+                if base <= seq < next_seq and now - resent_at.get(seq, 0) > rto:
+                    send(seq)
+                    resent_at[seq] = now
+                    retransmits += 1
+
+
+class _Incoming(object):
+    # Payloads are copied straight into one buffer sized from the header
+    def __init__(self, total_len, payload_size):
+        self.total_len = total_len
+        self.payload_size = payload_size
+        self.count = packet_count(total_len, payload_size)
+        self.buffer = bytearray(total_len)
+        self.received = bytearray(self.count)
+        self.last_packet = time.time()
+        self.cum_ack = 0
+        self.highest = -1
+        self.since_status = 0
+
+    def add(self, seq, payload):
+        offset = seq * self.payload_size
+        if seq >= self.count or self.received[seq] or len(payload) != min(self.payload_size, self.total_len - offset):
+            return
+        self.buffer[offset:offset + len(payload)] = payload
+        self.received[seq] = 1
+        self.highest = max(self.highest, seq)
+        while self.cum_ack < self.count and self.received[self.cum_ack]:
+            self.cum_ack += 1
+
+    def missing(self):
+        return [s for s in range(self.cum_ack, self.highest) if not self.received[s]]
+
+    def complete(self):
+        return self.cum_ack >= self.count
+
+    def data(self):
+        return bytes(self.buffer)
+
+
+class Receiver(object):
+    """
+    Receiving side of the protocol. Feed every transfer datagram into
+    handle(); it answers the sender and returns the reassembled bytes when
+    a transfer completes, otherwise None.
+    """
+
+    def __init__(self, sock, window=DEFAULT_WINDOW):
+        self.sock = sock
+        self.status_every = max(1, window // 4)
+        self._incoming = {}
+        self._finished = []  # Recently completed IDs, to re-ACK duplicates
+        self._buf = bytearray(RECV_BUFFER)
+
+    def receive(self):
+        """
+        Read one datagram into the receiver's preallocated buffer. The
+        returned memoryview is only valid until the next call.
+        """
+        return recv_into(self.sock, self._buf)
+
+    def expire(self, timeout=INCOMING_TIMEOUT):
+        """Drop partial transfers the sender has abandoned, freeing their buffers."""
+        now = time.time()
+        for transfer_id in [t for t, state in self._incoming.items() if now - state.last_packet > timeout]:
+            del self._incoming[transfer_id]
+
+    def _status(self, transfer_id, state, addr):
+        packet = build_ctrl_packet(STATUS, transfer_id, state.cum_ack, state.missing())
+        self.sock.sendto(packet, addr)
+        state.since_status = 0
+
+    def handle(self, data, addr):
+        if len(data) < CTRL_HEADER.size:
+            return None
+        kind = data[2]
+        if kind == POLL:
+            ctrl = parse_ctrl_packet(data)
+            if ctrl is None:
+                return None
+            transfer_id = ctrl[1]
+            if transfer_id in self._finished:
+                self.sock.sendto(build_ctrl_packet(DONE, transfer_id), addr)
+            elif transfer_id in self._incoming:
+                self._status(transfer_id, self._incoming[transfer_id], addr)
+            return None
+        if kind != DATA or len(data) < DATA_HEADER.size:
+            return None
+
+        _, _, transfer_id, seq, total_len, payload_size, crc = DATA_HEADER.unpack_from(data)
+        payload = data[DATA_HEADER.size:]
+        if transfer_id in self._finished:
+            self.sock.sendto(build_ctrl_packet(DONE, transfer_id), addr)
+            return None
+        if not payload_size or total_len > MAX_TRANSFER or _crc(data, len(data)) != crc:
+            return None  # Corrupted, it will show up as a gap and be NACKed
+
+        state = self._incoming.get(transfer_id)
+        if state is None:
+            self.expire()
+            state = self._incoming[transfer_id] = _Incoming(total_len, payload_size)
+        state.last_packet = time.time()
+        gap = seq > state.highest + 1
+        state.add(seq, payload)
+        state.since_status += 1
+
+        if state.complete():
+            del self._incoming[transfer_id]
+            self._finished.append(transfer_id)
+            del self._finished[:-32]
+            self.sock.sendto(build_ctrl_packet(DONE, transfer_id), addr)
+            return state.data()
+        if gap or state.since_status >= self.status_every:
+            self._status(transfer_id, state, addr)
+        return None
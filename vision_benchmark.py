@@ -0,0 +1,69 @@
+"""
+Vision throughput benchmark that runs on any machine.
+
+    python vision_benchmark.py --cameras synthetic,synthetic --mode count
+    python vision_benchmark.py --cameras video:show.mp4,images:frames/ --mode incremental-emotion
+"""
+import argparse
+import time
+
+import face_analysis
+import sources
+from vision_engine import VisionEngine, mean_face_count, emotion_totals, dominant
+
+MODES = ("count", "emotion", "incremental-count", "incremental-emotion")
+
+
+def make_analyzer(mode, cameras):
+    if mode == "count":
+        return face_analysis.count_only
+    if mode == "emotion":
+        return face_analysis.with_emotion
+    if mode.startswith("incremental"):
+        return face_analysis.incremental(cameras, emotion=mode.endswith("emotion"))
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+def run(camera_specs, mode="count", seconds=10, fps=15, workers=2):
+    cameras = {f"Camera {i}": sources.make_camera(spec, fps=0) for i, spec in enumerate(camera_specs)}
+    for camera in cameras.values():
+        camera.configure()
+    engine = VisionEngine(cameras, make_analyzer(mode, cameras), workers=workers)
+    try:
+        engine.sample(duration=1, fps=fps)  # Warm-up: model loads, first allocations
+        start = time.time()
+        results = engine.sample(duration=seconds, fps=fps)
+        elapsed = time.time() - start
+    finally:
+        engine.stop()
+        for camera in cameras.values():
+            camera.close()
+
+    latencies = sorted(r.latency for r in results) or [0.0]
+    print("-" * 60)
+    print(f"Mode:            {mode}")
+    print(f"Frames analysed: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f} fps total)")
+    print(f"Latency p50/p95: {latencies[len(latencies) // 2] * 1000:.0f} / "
+          f"{latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms")
+    print(f"Mean faces:      {mean_face_count(results, cameras):.2f}")
+    if "emotion" in mode:
+        print(f"Dominant:        {dominant(emotion_totals(results))}")
+    if mode.startswith("incremental"):
+        analyzer = engine.analyze
+        for name, tracker in analyzer.items():
+            print(f"{name}: {tracker.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vision pipeline against any camera source")
+    parser.add_argument("--cameras", default="synthetic,synthetic", help="Comma-separated source specs")
+    parser.add_argument("--mode", choices=MODES, default="count")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=15, help="Per-camera analysis cap (0 = unlimited)")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    run(args.cameras.split(","), args.mode, args.seconds, args.fps, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Pipelined multi-camera vision.
+
+    camera -> capture thread -> ring buffer --+
+    camera -> capture thread -> ring buffer --+--> analysis workers -> results
+
+Each camera is read by its own thread into a small ring buffer that always
+holds the newest frames. A pool of analysis workers pulls the newest frame
+it has not yet seen from whichever camera is due next, so both cameras are
+analysed at the same time and one loop iteration costs the slowest stage
+rather than the sum of two captures and two inferences. `sample()` collects
+the results for a time window and reports the frame rate actually achieved.
+"""
+import threading
+import time
+from collections import deque
+
+
+class FrameRing(object):
+    """Bounded buffer of (seq, timestamp, frame); old frames fall off the end."""
+
+    def __init__(self, size=3):
+        self._frames = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.seq = 0
+
+    def put(self, frame):
+        with self._cond:
+            self.seq += 1
+            self._frames.append((self.seq, time.time(), frame))
+            self._cond.notify_all()
+
+    def newest_after(self, seq, timeout=None):
+        """Newest frame with a sequence number above *seq*, waiting for one."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > seq, timeout):
+                return None
+            return self._frames[-1]
+
+
+class CaptureThread(threading.Thread):
+
+    def __init__(self, name, camera, ring, stop_event):
+        super().__init__(name=f"capture-{name}", daemon=True)
+        self.camera = camera
+        self.ring = ring
+        self.stop_event = stop_event
+        self.frames = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.ring.put(self.camera.capture_array())
+                self.frames += 1
+            except Exception as e:
+                print(f"Error capturing from {self.name}: {e}")
+                time.sleep(0.1)
+
+
+class VisionResult(object):
+    __slots__ = ("camera", "timestamp", "faces", "latency")
+
+    def __init__(self, camera, timestamp, faces, latency):
+        self.camera = camera
+        self.timestamp = timestamp
+        self.faces = faces
+        self.latency = latency
+
+
+class Subscription(object):
+    """One attached consumer: its sink, per-camera rate and analysis function."""
+
+    def __init__(self, sink, interval, analyze, cameras):
+        self.sink = sink
+        self.interval = interval
+        self.analyze = analyze
+        self.next_due = {name: 0.0 for name in cameras}
+
+
+class VisionEngine(object):
+    """
+    *cameras* maps a name to anything with capture_array(). *analyze* takes a
+    frame and returns a list of face dicts (DeepFace.analyze style); it may
+    also be a dict of per-camera functions for analysers that keep state.
+    Several sinks can be attached at once (e.g. the background monitor and a
+    one-off sample), each with its own rate and analysis function.
+    """
+
+    def __init__(self, cameras, analyze, workers=None, ring_size=3):
+        self.cameras = dict(cameras)
+        self.analyze = analyze
+        self.workers = workers or len(self.cameras)
+        self.rings = {name: FrameRing(ring_size) for name in self.cameras}
+        self._stop = threading.Event()
+        self._active = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_claimed = {name: 0 for name in self.cameras}
+        self._next_due = {name: 0.0 for name in self.cameras}
+        self._frame_interval = 0.0
+        self._subscriptions = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for name, camera in self.cameras.items():
+            thread = CaptureThread(name, camera, self.rings[name], self._stop)
+            thread.start()
+            self._threads.append(thread)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"analyze-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._active.set()  # Release idle workers so they can exit
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._active.clear()
+
+    def _claim(self):
+        """
+        Take the newest unanalysed frame from the camera that is due soonest.
+        Several workers may be busy on the same camera, each with a newer frame.
+        """
+        with self._lock:
+            now = time.time()
+            ready = [n for n in self.cameras
+                     if self.rings[n].seq > self._last_claimed[n] and now >= self._next_due[n]]
+            if not ready:
+                return None, None
+            name = min(ready, key=lambda n: self._next_due[n])
+            item = self.rings[name].newest_after(self._last_claimed[name], timeout=0)
+            if item is None:
+                return None, None
+            self._last_claimed[name] = item[0]
+            # Keep a steady per-camera rate, allowing up to half a frame of catch-up
+            self._next_due[name] = max(self._next_due[name], now - self._frame_interval / 2) + self._frame_interval
+            # Sinks wanting this camera now; slower sinks skip frames in between
+            due = []
+            for sub in self._subscriptions:
+                if now >= sub.next_due[name] - self._frame_interval / 2:
+                    sub.next_due[name] = max(sub.next_due[name], now - sub.interval / 2) + sub.interval
+                    due.append(sub)
+            return name, (item, due)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            self._active.wait()
+            if self._stop.is_set():
+                return
+            name, claimed = self._claim()
+            if name is None:
+                time.sleep(0.002)
+                continue
+            (_, captured, frame), due = claimed
+            # Each distinct analysis function runs once per frame, shared by its sinks
+            results = {}
+            for sub in due:
+                key = id(sub.analyze)
+                if key not in results:
+                    try:
+                        analyze = sub.analyze[name] if isinstance(sub.analyze, dict) else sub.analyze
+                        results[key] = analyze(frame) or []
+                    except Exception as e:
+                        print(f"Error during analysis ({name}): {e}")
+                        results[key] = []
+                sub.sink(VisionResult(name, captured, results[key], time.time() - captured))
+
+    def attach(self, sink, fps=15, analyze=None):
+        """
+        Continuously feed results to *sink*, at most *fps* per camera. A
+        different *analyze* function can be used for this sink. Returns the
+        subscription to pass to detach().
+        """
+        self.start()
+        sub = Subscription(sink, 1.0 / fps if fps else 0.0, analyze or self.analyze, self.cameras)
+        with self._lock:
+            self._subscriptions.append(sub)
+            self._frame_interval = min(s.interval for s in self._subscriptions)
+        self._active.set()
+        return sub
+
+    def detach(self, subscription=None):
+        """Stop feeding *subscription* (every sink if None); others keep running."""
+        with self._lock:
+            if subscription is None:
+                self._subscriptions = []
+            elif subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            if self._subscriptions:
+                self._frame_interval = min(s.interval for s in self._subscriptions)
+            else:
+                self._active.clear()
+
+    def sample(self, duration=2, fps=15, analyze=None):
+        """Run analysis for *duration* seconds, at most *fps* per camera."""
+        results = []
+        start = time.time()
+        sub = self.attach(results.append, fps, analyze)
+        time.sleep(duration)
+        self.detach(sub)
+        elapsed = time.time() - start
+        per_camera = {name: sum(1 for r in results if r.camera == name) / elapsed for name in self.cameras}
+        rates = ", ".join(f"{name} {rate:.1f}" for name, rate in per_camera.items())
+        print(f"Vision: {len(results)} frames in {elapsed:.2f}s ({rates} fps)")
+        return results
+
+
+def mean_face_count(results, cameras):
+    """Average faces per frame for each camera, summed over the cameras."""
+    total = 0.0
+    for name in cameras:
+        counts = [len(r.faces) for r in results if r.camera == name]
+        if counts:
+            total += sum(counts) / len(counts)
+    return total
+
+
+EMOTIONS = ('sad', 'happy', 'angry', 'neutral', 'surprise', 'disgust', 'fear')
+
+
+def emotion_totals(results):
+    totals = dict.fromkeys(EMOTIONS, 0)
+    for result in results:
+        for face in result.faces:
+            for key, value in face.get('emotion', {}).items():
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def dominant(totals):
+    """Key with the largest positive total, or '' if there is none."""
+    best, best_val = '', 0
+    for key, value in totals.items():
+        if value > best_val:
+            best, best_val = key, value
+    return best
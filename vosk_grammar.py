@@ -0,0 +1,93 @@
+"""
+Grammar-restricted Vosk recognition for closed-vocabulary answers.
+
+When the robot asks where someone is from or what they do, the answer is one
+of a few hundred phrases. Building the KaldiRecognizer with that phrase list
+as its grammar means the decoder only searches those paths: the small model
+is enough, decoding keeps up with the mic, and the result is snapped to a
+phrase we can use instead of free text.
+
+Vocabularies are plain text files, one phrase per line (# for comments);
+VOCABULARIES maps the names used by LLM_Joke to the default files and can be
+pointed elsewhere, or a list of paths can be passed directly.
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import audio_utils
+import startup
+import stt_models
+
+VOCAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocab")
+VOCABULARIES = {
+    "location": [os.path.join(VOCAB_DIR, "locations.txt")],
+    "profession": [os.path.join(VOCAB_DIR, "professions.txt")],
+}
+UNKNOWN = "[unk]"
+
+GrammarMatch = namedtuple("GrammarMatch", ["text", "confidence"])
+
+
+def load_vocabulary(vocabulary):
+    """Phrases from a VOCABULARIES name, a file path or a list of file paths."""
+    paths = VOCABULARIES.get(vocabulary, vocabulary) if isinstance(vocabulary, str) else vocabulary
+    if isinstance(paths, str):
+        paths = [paths]
+    phrases = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                phrase = " ".join(line.split("#")[0].lower().split())
+                if phrase and phrase not in phrases:
+                    phrases.append(phrase)
+    return phrases
+
+
+class GrammarRecognizer(object):
+    """
+    Streaming recognizer restricted to *phrases*. Feed 16 kHz int16 frames
+    with accept() as they are recorded, then call result(); the recognizer
+    is reset by result() and can be reused for the next answer.
+    """
+
+    def __init__(self, phrases, model_path="vosk-model-small-en-us-0.15"):
+        self.phrases = list(phrases)
+        vosk = startup.load("vosk")
+        # [unk] lets out-of-grammar speech come back as unknown instead of
+        # being forced onto the nearest phrase
+        grammar = json.dumps(self.phrases + [UNKNOWN])
+        self._rec = vosk.KaldiRecognizer(stt_models.get_vosk_model(model_path), audio_utils.STT_RATE, grammar)
+        self._rec.SetWords(True)
+
+    def accept(self, pcm16):
+        self._rec.AcceptWaveform(np.ascontiguousarray(pcm16, dtype=np.int16).tobytes())
+
+    def result(self):
+        """Best phrase heard and its mean word confidence (0-1); ("", 0.0) if none."""
+        result = json.loads(self._rec.FinalResult())
+        words = [w for w in result.get("result", []) if w.get("word") != UNKNOWN]
+        text = " ".join(w["word"] for w in words)
+        if not text:
+            return GrammarMatch("", 0.0)
+        return GrammarMatch(text, sum(w.get("conf", 0.0) for w in words) / len(words))
+
+    def recognize(self, audio, chunk=4000):
+        """Whole-clip convenience: feed *audio* in mic-sized chunks and return the match."""
+        for i in range(0, len(audio), chunk):
+            self.accept(audio[i:i + chunk])
+        return self.result()
+
+
+_recognizers = {}
+
+
+def get_recognizer(vocabulary, model_path="vosk-model-small-en-us-0.15"):
+    """Shared recognizer per (vocabulary, model); the grammar is compiled once."""
+    key = (json.dumps(vocabulary), model_path)
+    recognizer = _recognizers.get(key)
+    if recognizer is None:
+        recognizer = _recognizers[key] = GrammarRecognizer(load_vocabulary(vocabulary), model_path)
+    return recognizer